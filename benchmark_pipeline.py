@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from fake_services import FakeServices
+from synthetic_corpus import generate_corpus
+
+REPO = Path(__file__).resolve().parent
+
+# Stages in pipeline order, and the fake service whose request latencies describe them
+STAGES = {
+    "listing": None,
+    "dedupe": None,
+    "convert_docx": None,
+    "convert_pdf": None,
+    "extract_html": "openai",
+    "extract_text": "openai",
+    "drive": "landingai",
+    "sink": None,
+    "concatenation": None,
+}
+
+
+# ------------------------------------------------------------------
+# HELPERS
+# ------------------------------------------------------------------
+def percentile(values, q: float):
+    """Nearest-rank percentile in milliseconds, or None without samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return round(ordered[index] * 1000, 2)
+
+
+def time_calls(owner, name: str, latencies: list):
+    """Replace owner.name with a wrapper that appends each call's duration to latencies."""
+    original = getattr(owner, name)
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    setattr(owner, name, timed)
+
+
+def count_lines(paths) -> int:
+    total = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            total += sum(1 for line in f if line.strip())
+    return total
+
+
+def fresh_copy(source: Path, target: Path) -> Path:
+    """The extractors delete what they process, so each run gets its own copy."""
+    if target.exists():
+        shutil.rmtree(target)
+    shutil.copytree(source, target)
+    return target
+
+
+# ------------------------------------------------------------------
+# STAGES (run in a child process each, so peak memory is per stage)
+# ------------------------------------------------------------------
+def run_stage(stage: str, workdir: Path) -> dict:
+    lists = workdir / "lists"
+    lists.mkdir(exist_ok=True)
+    os.chdir(workdir)
+    latencies = []
+
+    if stage == "listing":
+        import extract_all_file_names as m
+        m.root_folder = workdir / "media"
+        m.manifest_file = lists / "file_manifest.json"
+        m.incremental = False
+        time_calls(m, "scan_directory", latencies)
+        os.chdir(lists)
+        m.main()
+        items = count_lines(lists.glob("file_list_*.txt"))
+
+    elif stage == "dedupe":
+        import dedupe_documents as m
+        m.txt_file = next(lists.glob("file_list_docx_*.txt"))
+        m.unique_list_file = lists / "docx_unique.txt"
+        m.duplicates_file = lists / "docx_duplicates.json"
+        time_calls(m, "hash_file", latencies)
+        m.main()
+        items = count_lines([m.txt_file])
+
+    elif stage == "convert_docx":
+        import mammoth
+        import convert_docx_to_html_files as m
+        unique = lists / "docx_unique.txt"
+        m.txt_file = unique if unique.exists() else next(lists.glob("file_list_docx_*.txt"))
+        m.output_folder = workdir / "converted_html"
+        m.image_folder = m.output_folder / "images"
+        time_calls(mammoth, "convert_to_html", latencies)
+        m.main()
+        items = len(latencies)
+
+    elif stage == "convert_pdf":
+        import convert_pdf_to_text_files as m
+        m.txt_file = next(lists.glob("file_list_pdf_*.txt"))
+        m.output_folder = workdir / "converted_text"
+        time_calls(m, "pdf_to_text", latencies)
+        m.main()
+        items = len(latencies)
+
+    elif stage in ("extract_html", "extract_text"):
+        kind = stage.split("_")[1]
+        folder = fresh_copy(workdir / kind, workdir / "run" / kind)
+        items = sum(1 for _ in folder.iterdir())
+        if kind == "html":
+            import extract_json_props_from_html as m
+        else:
+            import extract_json_props_from_text as m
+        # The near-duplicate index and the result CSVs persist across runs; a reused workdir must start empty
+        m.near_duplicate_index_file = workdir / "run" / f"near_duplicate_index_{kind}.json"
+        m.near_duplicate_index_file.unlink(missing_ok=True)
+        for old_results in workdir.glob("lab_results_*.csv" if kind == "html" else "external_lab_results_*.csv"):
+            old_results.unlink()
+        m.main([str(folder)])
+
+    elif stage == "drive":
+        import extract_json_props_from_google_drive_images as m
+        items = sum(1 for _ in (workdir / "drive").iterdir())
+        for old_results in workdir.glob("results_*.csv"):
+            old_results.unlink()
+        m.main([])
+
+    elif stage == "sink":
+        import flatten_extracted_json as m
+        m.results_folder = workdir
+        m.output_folder = workdir / "parquet"
+        time_calls(m, "build_tables", latencies)
+        m.main()
+        items = sum(count_lines([p]) - 1 for s in m.SOURCES for p in workdir.glob(s["csv_glob"]))
+
+    elif stage == "concatenation":
+        import concatenate_csvs as m
+        m.CSV_FOLDER = workdir / "csvs"
+        m.OUTPUT_FILE = workdir / "combined.parquet"
+        m.SCHEMA_REPORT_FILE = workdir / "combined_schema_report.json"
+        time_calls(m, "read_csv_file", latencies)
+        m.main()
+        items = len(latencies)
+
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    return {"items": items, "latencies": latencies}
+
+
+def child_main(stage: str, workdir: Path, result_file: Path):
+    sys.path.insert(0, str(REPO))
+    started = time.perf_counter()
+    result = run_stage(stage, workdir)
+    result["seconds"] = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ------------------------------------------------------------------
+# BENCHMARK
+# ------------------------------------------------------------------
+def summarize(result: dict, latencies: list) -> dict:
+    seconds = result["seconds"]
+    return {
+        "items": result["items"],
+        "seconds": round(seconds, 3),
+        "throughput_per_s": round(result["items"] / seconds, 2) if seconds else None,
+        "latency_samples": len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "peak_rss_mb": result["peak_rss_mb"],
+    }
+
+
+def run_benchmark(args) -> dict:
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="pipeline_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    (workdir / "logs").mkdir(exist_ok=True)
+
+    print(f"Generating corpus of {args.documents} documents in {workdir}")
+    corpus = generate_corpus(
+        workdir, documents=args.documents, duplicate_rate=args.duplicate_rate,
+        image_rate=args.image_rate, pdf_pages=args.pdf_pages, csv_files=args.csv_files,
+        csv_rows=args.csv_rows, rules_complete_rate=args.rules_complete_rate, seed=args.seed,
+    )
+
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+        "corpus": corpus,
+        "stages": {},
+    }
+
+    with FakeServices(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                      rate_limit_rate=args.rate_limit_rate, drive_folder=workdir / "drive", seed=args.seed) as services:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY="benchmark",
+            OPENAI_BASE_URL=f"{services.url}/v1",
+            VA_API_KEY="benchmark",
+            VA_API_URL=services.url,
+            DRIVE_API_ENDPOINT=f"{services.url}/drive/v3/",
+        )
+        for stage in stages:
+            service = STAGES[stage]
+            first_request = len(services.requests)
+            result_file = workdir / "logs" / f"{stage}.json"
+            with open(workdir / "logs" / f"{stage}.log", "w", encoding="utf-8") as log:
+                process = subprocess.run(
+                    [sys.executable, str(Path(__file__).resolve()), "--run-stage", stage, "--workdir", str(workdir),
+                     "--result-file", str(result_file)],
+                    env=env, stdout=log, stderr=subprocess.STDOUT, cwd=workdir,
+                )
+            if process.returncode != 0 or not result_file.exists():
+                print(f"[ERROR] {stage} failed, see {workdir / 'logs' / (stage + '.log')}")
+                report["stages"][stage] = {"error": f"exit code {process.returncode}"}
+                continue
+
+            with open(result_file, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            latencies = result["latencies"]
+            if service:
+                requests = services.requests[first_request:]
+                latencies = [seconds for name, status, seconds in requests if name == service]
+                result_status = {}
+                for name, status, _ in requests:
+                    result_status[f"{name}:{status}"] = result_status.get(f"{name}:{status}", 0) + 1
+            summary = summarize(result, latencies)
+            if service:
+                summary["requests"] = result_status
+            report["stages"][stage] = summary
+            print(
+                f"[DONE] {stage}: {summary['items']} items in {summary['seconds']}s "
+                f"({summary['throughput_per_s']}/s, p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, "
+                f"{summary['peak_rss_mb']} MiB)"
+            )
+
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(report: dict, baseline: dict):
+    """Print each stage's change against a baseline run."""
+    print(f"\nCompared with baseline from {baseline.get('created')}:")
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in current or "error" in previous:
+            print(f"  {stage}: no comparable baseline")
+            continue
+        changes = []
+        for key, label in (("throughput_per_s", "throughput"), ("p50_ms", "p50"), ("p99_ms", "p99"), ("peak_rss_mb", "memory")):
+            if current.get(key) is not None and previous.get(key):
+                changes.append(f"{label} {100 * (current[key] - previous[key]) / previous[key]:+.1f}%")
+        print(f"  {stage}: {', '.join(changes)}")
+
+
+# ------------------------------------------------------------------
+# ENTRY POINT
+# ------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on a synthetic corpus against fake services.")
+    parser.add_argument("--documents", type=int, default=200, help="synthetic reports to generate")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--image-rate", type=float, default=0.5, help="fraction of DOCX with an embedded image")
+    parser.add_argument("--pdf-pages", type=int, default=2)
+    parser.add_argument("--csv-files", type=int, default=20)
+    parser.add_argument("--csv-rows", type=int, default=5000)
+    parser.add_argument("--rules-complete-rate", type=float, default=0.3,
+                        help="fraction of reports the rules can complete without the LLM")
+    parser.add_argument("--latency-ms", type=float, default=200, help="mean fake service latency")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake responses that are 500s")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of fake responses that are 429s")
+    parser.add_argument("--stages", help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="where to build the corpus (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    parser.add_argument("--output", default=f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        child_main(args.run_stage, Path(args.workdir), Path(args.result_file))
+        return
+
+    report = run_benchmark(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import json
+import logging
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Documents longer than this are split and extracted chunk by chunk (~3k tokens)
+max_chunk_chars = 12000
+# Chunks of one document extracted concurrently
+max_chunk_workers = 4
+# Pieces shorter than this are not sent on their own but lead the next chunk
+min_chunk_chars = 1000
+
+# convert_pdf_to_text_files.py separates pages with a form feed
+PAGE_BREAK = "\f"
+# Split HTML after block-level closing tags so paragraphs stay whole (tables are handled separately)
+_HTML_BLOCK_END = re.compile(r"(?<=</p>)|(?<=</ul>)|(?<=</ol>)|(?<=</h[1-6]>)", re.IGNORECASE)
+# Tags that delimit tables and their rows; mammoth nests <p> (and tables) inside cells
+_TABLE_TAG = re.compile(r"<(/?)table\b[^>]*>|</tr\s*>", re.IGNORECASE)
+_TABLE_START = re.compile(r"\s*<table\b", re.IGNORECASE)
+
+
+# ------------------------------------------------------------------
+# SPLITTING
+# ------------------------------------------------------------------
+def _hard_split(piece: str, max_chars: int) -> list:
+    """
+    Split an oversized piece on line breaks, cutting lines only as a last
+    resort, and then after a tag or at a space rather than inside a word.
+    """
+    parts = []
+    for line in piece.splitlines(keepends=True):
+        while len(line) > max_chars:
+            cut = max(line.rfind(">", 0, max_chars) + 1, line.rfind(" ", 0, max_chars) + 1)
+            cut = cut if cut > max_chars // 2 else max_chars
+            parts.append(line[:cut])
+            line = line[cut:]
+        parts.append(line)
+    return parts
+
+
+def _split_plain(piece: str, max_chars: int) -> list:
+    return _pack(_hard_split(piece, max_chars), max_chars)
+
+
+def _pack(pieces, max_chars: int, split_piece=_split_plain) -> list:
+    """
+    Greedily join consecutive pieces into chunks of at most max_chars.
+    Oversized pieces are cut with split_piece; a short piece left over
+    before a flush (a title, a patient name line) leads the next chunk
+    instead of becoming a request of its own, which may push that chunk
+    up to min_chunk_chars over max_chars.
+    """
+    chunks, current = [], ""
+    for piece in pieces:
+        if len(current) + len(piece) <= max_chars:
+            current += piece
+            continue
+        if len(current) >= min(min_chunk_chars, max_chars // 2):
+            chunks.append(current)
+            current = ""
+        if len(piece) <= max_chars:
+            current += piece
+            continue
+        # Cut with room for the short leading piece, and keep packing after the last part
+        parts = split_piece(piece, max_chars - len(current))
+        parts[0] = current + parts[0]
+        chunks.extend(parts[:-1])
+        current = parts[-1]
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def split_text(text: str, max_chars: int = max_chunk_chars) -> list:
+    """Split plain text on page breaks, falling back to paragraphs for long pages."""
+    pieces = []
+    for page in text.split(PAGE_BREAK):
+        if len(page) > max_chars:
+            pieces.extend(re.split(r"(?<=\n\n)", page))
+        else:
+            pieces.append(page)
+    return _pack(pieces, max_chars)
+
+
+def _html_blocks(html: str) -> list:
+    """Top-level tables as whole pieces, everything between them split after block-level tags."""
+    pieces, depth, start, position = [], 0, 0, 0
+    for match in _TABLE_TAG.finditer(html):
+        if match.group(0).lower().startswith("</tr"):
+            continue
+        if not match.group(1):
+            if depth == 0:
+                pieces.extend(_HTML_BLOCK_END.split(html[position:match.start()]))
+                start = match.start()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                pieces.append(html[start:match.end()])
+                position = match.end()
+    pieces.extend([html[start:]] if depth else _HTML_BLOCK_END.split(html[position:]))
+    return [piece for piece in pieces if piece]
+
+
+def _split_table(table: str, max_chars: int) -> list:
+    """
+    Split a table at its top-level </tr> into tables of at most max_chars,
+    each repeating the opening tags and the first (header) row so the model
+    knows what every column means.
+    """
+    row_ends, depth = [], 0
+    for match in _TABLE_TAG.finditer(table):
+        tag = match.group(0).lower()
+        if tag.startswith("</tr"):
+            if depth == 1:
+                row_ends.append(match.end())
+        elif match.group(1):
+            depth -= 1
+        else:
+            depth += 1
+    if len(row_ends) < 2:
+        return _split_plain(table, max_chars)
+
+    first_row_start = table.lower().find("<tr", 0, row_ends[0])
+    prefix = table[:first_row_start]
+    header = table[first_row_start:row_ends[0]]
+    suffix = table[row_ends[-1]:]
+    rows = [table[a:b] for a, b in zip(row_ends, row_ends[1:])]
+
+    frame = len(prefix) + len(header) + len(suffix)
+    chunks, current = [], []
+    for row in rows:
+        if current and frame + sum(map(len, current)) + len(row) > max_chars:
+            chunks.append(prefix + header + "".join(current) + suffix)
+            current = []
+        if frame + len(row) > max_chars:
+            # A single row too large for any chunk: cut it on its own as a last resort
+            chunks.extend(_split_plain(row, max_chars))
+            continue
+        current.append(row)
+    if current:
+        chunks.append(prefix + header + "".join(current) + suffix)
+    return chunks
+
+
+def _split_html_piece(piece: str, max_chars: int) -> list:
+    if _TABLE_START.match(piece):
+        return _split_table(piece, max_chars)
+    return _split_plain(piece, max_chars)
+
+
+def split_html(html: str, max_chars: int = max_chunk_chars) -> list:
+    """Split HTML between block-level elements, and large tables between rows."""
+    return _pack(_html_blocks(html), max_chars, _split_html_piece)
+
+
+# ------------------------------------------------------------------
+# MERGING
+# ------------------------------------------------------------------
+def root_schema(schema: dict) -> dict:
+    """Accept a plain JSON schema or an OpenAI-style {"name": ..., "schema": {...}} wrapper."""
+    if isinstance(schema, dict) and "properties" not in schema and isinstance(schema.get("schema"), dict):
+        return schema["schema"]
+    return schema if isinstance(schema, dict) else {}
+
+
+def _schema_type(schema: dict, value):
+    declared = schema.get("type")
+    if isinstance(declared, list):
+        declared = next((t for t in declared if t != "null"), None)
+    if declared:
+        return declared
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return "scalar"
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def merge_values(values: list, schema: dict = None, path: str = ""):
+    """
+    Merge the values one field took in several chunks:
+    arrays are concatenated (identical items kept once), objects are merged
+    field by field, and scalars take the most common non-empty value, ties
+    going to the earliest chunk.
+    """
+    schema = schema or {}
+    present = [v for v in values if not _is_empty(v)]
+    if not present:
+        return values[0] if values else None
+
+    kind = _schema_type(schema, present[0])
+    if kind == "array":
+        merged, seen = [], set()
+        for value in present:
+            for item in value if isinstance(value, list) else [value]:
+                key = json.dumps(item, sort_keys=True, ensure_ascii=False)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(item)
+        return merged
+
+    if kind == "object":
+        objects = [v for v in present if isinstance(v, dict)]
+        properties = schema.get("properties", {})
+        keys = list(dict.fromkeys(k for obj in objects for k in obj))
+        return {
+            key: merge_values([obj[key] for obj in objects if key in obj], properties.get(key), f"{path}.{key}".lstrip("."))
+            for key in keys
+        }
+
+    counts = Counter(json.dumps(v, sort_keys=True, ensure_ascii=False) for v in present)
+    if len(counts) > 1:
+        logging.info(f"Conflicting values for {path or 'value'} across chunks: {list(counts)}; keeping most common")
+    best = max(counts.values())
+    return next(v for v in present if counts[json.dumps(v, sort_keys=True, ensure_ascii=False)] == best)
+
+
+def merge_results(results: list, schema: dict) -> dict:
+    """Merge the partial JSON of every chunk of a document according to the schema."""
+    return merge_values(results, root_schema(schema)) or {}
+
+
+# ------------------------------------------------------------------
+# EXTRACTION
+# ------------------------------------------------------------------
+def extract_in_chunks(document: str, extract_fn, schema: dict, kind: str = "text",
+                      max_chars: int = max_chunk_chars, max_workers: int = max_chunk_workers) -> dict:
+    """
+    Run extract_fn on the whole document if it is short, otherwise on each
+    chunk concurrently and merge the results, so latency follows the
+    slowest chunk rather than the document length.
+    """
+    if len(document) <= max_chars:
+        return extract_fn(document)
+
+    chunks = split_html(document, max_chars) if kind == "html" else split_text(document, max_chars)
+    if len(chunks) == 1:
+        return extract_fn(chunks[0])
+
+    logging.info(f"Extracting {len(chunks)} chunks of {len(document)} chars with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(extract_fn, chunks))
+    return merge_results(results, schema)
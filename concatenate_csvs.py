@@ -1,39 +1,172 @@
-import pandas as pd
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import pandas as pd
+from pandas.api import types as ptypes
+
 # Folder containing your CSV files
 CSV_FOLDER = Path("/opt/softwares/automations_and_data_pipelines/data/csvs/patient_history_bahari_medical")
 
-# Output file
-OUTPUT_FILE = "/opt/softwares/automations_and_data_pipelines/data/csvs/patient_history_bahari_medical/combined.csv"
+# Output file (Parquet, so downstream queries don't re-parse a giant CSV)
+OUTPUT_FILE = CSV_FOLDER / "combined.parquet"
+
+# Optional CSV copy of the combined data (set to None to skip)
+OUTPUT_CSV = None
 
-# List all .csv files
-csv_files = list(CSV_FOLDER.glob("*.csv"))
+# Report of columns whose dtype / presence differed between files
+SCHEMA_REPORT_FILE = CSV_FOLDER / "combined_schema_report.json"
 
-if not csv_files:
-    print("No CSV files found.")
-    exit()
+# Parallel reading
+MAX_WORKERS = 8
+CSV_ENGINE = "pyarrow"  # "pyarrow" (multithreaded, needs pyarrow) or "c" (pandas default)
 
-print(f"Found {len(csv_files)} CSV files. Combining...")
 
-# Read and combine
-df_list = []
-for file in csv_files:
+# ------------------------------------------------------------------
+# READING
+# ------------------------------------------------------------------
+def resolve_engine(engine: str) -> str:
+    if engine != "pyarrow":
+        return engine
     try:
-        df = pd.read_csv(file)
-        df_list.append(df)
-        print(f"Loaded: {file.name}")
-    except Exception as e:
-        print(f"Error reading {file.name}: {e}")
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("pyarrow not installed, falling back to the C parser.")
+        return "c"
+    return engine
+
+
+def read_csv_file(file: Path, engine: str) -> pd.DataFrame:
+    return pd.read_csv(file, engine=engine)
+
+
+def read_all(csv_files, engine: str, max_workers: int) -> dict:
+    """Read every file on a thread pool. Returns {path: DataFrame}, skipping failures."""
+    frames = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(read_csv_file, file, engine): file for file in csv_files}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                frames[file] = future.result()
+                print(f"Loaded: {file.name} ({len(frames[file])} rows)")
+            except Exception as e:
+                print(f"Error reading {file.name}: {e}")
+    # Keep the original file order so the output is deterministic
+    return {file: frames[file] for file in csv_files if file in frames}
+
+
+# ------------------------------------------------------------------
+# SCHEMA UNIFICATION
+# ------------------------------------------------------------------
+def resolve_dtype(dtypes) -> str:
+    """Pick one nullable dtype every observed dtype of a column can be cast to."""
+    if all(ptypes.is_bool_dtype(d) for d in dtypes):
+        return "boolean"
+    if all(ptypes.is_integer_dtype(d) and not ptypes.is_bool_dtype(d) for d in dtypes):
+        return "Int64"
+    if all(ptypes.is_numeric_dtype(d) and not ptypes.is_bool_dtype(d) for d in dtypes):
+        return "Float64"
+    if all(ptypes.is_datetime64_any_dtype(d) for d in dtypes):
+        return "datetime64[ns]"
+    return "string"
+
+
+def unify_schema(frames: dict):
+    """
+    Build the union of all columns and a single dtype per column.
+    Returns (columns, target_dtypes, report) where report only lists
+    columns that were missing from some files or had conflicting dtypes.
+    """
+    columns = []
+    observed = {}  # column -> {file name: dtype}
+    for file, df in frames.items():
+        for col in df.columns:
+            if col not in observed:
+                columns.append(col)
+                observed[col] = {}
+            observed[col][file.name] = df[col].dtype
+
+    target_dtypes = {}
+    report = {}
+    all_files = [file.name for file in frames]
+    for col in columns:
+        per_file = observed[col]
+        target = resolve_dtype(list(per_file.values()))
+        target_dtypes[col] = target
+
+        distinct = {str(d) for d in per_file.values()}
+        missing_in = [name for name in all_files if name not in per_file]
+        if len(distinct) > 1 or missing_in:
+            report[col] = {
+                "resolved_dtype": target,
+                "dtypes": {name: str(d) for name, d in per_file.items()},
+                "missing_in": missing_in,
+            }
+
+    return columns, target_dtypes, report
+
+
+def conform(df: pd.DataFrame, columns, target_dtypes) -> pd.DataFrame:
+    df = df.reindex(columns=columns)
+    for col, dtype in target_dtypes.items():
+        try:
+            df[col] = df[col].astype(dtype)
+        except (TypeError, ValueError):
+            df[col] = df[col].astype("string")
+    return df
+
+
+# ------------------------------------------------------------------
+# MAIN SCRIPT
+# ------------------------------------------------------------------
+def main():
+    # List all .csv files
+    csv_files = sorted(CSV_FOLDER.glob("*.csv"))
+
+    if not csv_files:
+        print("No CSV files found.")
+        return
+
+    engine = resolve_engine(CSV_ENGINE)
+    print(f"Found {len(csv_files)} CSV files. Combining with {MAX_WORKERS} workers ({engine} engine)...")
+
+    frames = read_all(csv_files, engine, MAX_WORKERS)
+    if not frames:
+        print("No CSV files could be read.")
+        return
+
+    # Unify columns and dtypes across all files
+    columns, target_dtypes, report = unify_schema(frames)
+    if report:
+        print(f"Schema conflicts in {len(report)} column(s):")
+        for col, info in report.items():
+            detail = ", ".join(sorted(set(info["dtypes"].values())))
+            missing = f", missing in {len(info['missing_in'])} file(s)" if info["missing_in"] else ""
+            print(f"  {col}: {detail}{missing} → {info['resolved_dtype']}")
+        with open(SCHEMA_REPORT_FILE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Schema report saved to: {SCHEMA_REPORT_FILE}")
+
+    # Concatenate all dataframes
+    combined_df = pd.concat(
+        [conform(df, columns, target_dtypes) for df in frames.values()],
+        ignore_index=True,
+    )
+
+    # Remove duplicate rows (optional)
+    combined_df = combined_df.drop_duplicates()
+
+    # Save result
+    combined_df.to_parquet(OUTPUT_FILE, index=False)
+    print(f"Combined Parquet saved to: {OUTPUT_FILE}")
 
-# Concatenate all dataframes
-combined_df = pd.concat(df_list, ignore_index=True)
+    if OUTPUT_CSV:
+        combined_df.to_csv(OUTPUT_CSV, index=False)
+        print(f"Combined CSV saved to: {OUTPUT_CSV}")
 
-# Remove duplicate rows (optional)
-combined_df = combined_df.drop_duplicates()
+    print(f"Total rows: {combined_df.shape[0]}")
 
-# Save result
-combined_df.to_csv(OUTPUT_FILE, index=False)
 
-print(f"Combined CSV saved to: {OUTPUT_FILE}")
-print(f"Total rows: {combined_df.shape[0]}")
+if __name__ == "__main__":
+    main()
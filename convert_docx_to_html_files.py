@@ -1,34 +1,122 @@
+import math
 from pathlib import Path
 import mammoth
 
+import pipeline_metrics
+
 # ---- 1. Read paths from the TXT file ----
 txt_file = Path("/opt/softwares/automations_and_data_pipelines/file_list_20251212_092317.txt")  # ← change to your actual file name
 
-with open(txt_file, "r", encoding="utf-8") as f:
-    docx_paths = [Path(line.strip()) for line in f if line.strip()]
-
-# ---- 2. Create output folder ----
+# ---- 2. Output folder ----
 output_folder = Path("data/html_outputs")
-output_folder.mkdir(exist_ok=True)
 
-# ---- 3. Convert each DOCX to HTML ----
-for docx_path in docx_paths:
-    if not docx_path.exists():
-        print(f"[SKIPPED] File not found → {docx_path}")
-        continue
+# ---- Embedded images (logos, signatures, scans) ----
+# "drop"  → leave images out of the HTML entirely (smallest prompts)
+# "files" → write images to output_folder/images and reference them by relative path
+# "keep"  → mammoth default, inline base64 data URIs
+image_mode = "drop"
+image_folder = output_folder / "images"
+
+# Rough chars-per-token ratio used to estimate prompt tokens saved
+chars_per_token = 4
+
+
+def inline_size(image_bytes: int, content_type: str) -> int:
+    """Size the image would take in the HTML as a base64 data URI."""
+    return len(f'data:{content_type};base64,') + 4 * math.ceil(image_bytes / 3)
+
+
+def make_image_converter(mode: str, stem: str, stats: dict):
+    """
+    Build a mammoth convert_image callback for the given mode.
+    Adds the count and the inline bytes avoided to stats.
+    """
+    if mode == "keep":
+        return mammoth.images.data_uri
+
+    def convert_image(image):
+        with image.open() as image_file:
+            data = image_file.read()
+        stats["images"] += 1
+        stats["saved_bytes"] += inline_size(len(data), image.content_type)
+
+        if mode == "drop":
+            return []
+
+        extension = mammoth.images.image_filename_extension(image) or "bin"
+        image_path = image_folder / f"{stem}_{stats['images']}.{extension}"
+        image_path.write_bytes(data)
+        src = image_path.relative_to(output_folder).as_posix()
+        stats["saved_bytes"] -= len(f'src="{src}"')
+
+        attributes = {"src": src}
+        if image.alt_text:
+            attributes["alt"] = image.alt_text
+        return [mammoth.html.element("img", attributes)]
+
+    return convert_image
+
+
+def main():
+    if image_mode not in ("drop", "files", "keep"):
+        raise ValueError(f"Unknown image_mode: {image_mode}")
+
+    with open(txt_file, "r", encoding="utf-8") as f:
+        docx_paths = [Path(line.strip()) for line in f if line.strip()]
+
+    output_folder.mkdir(exist_ok=True)
+    if image_mode == "files":
+        image_folder.mkdir(exist_ok=True)
+
+    total_saved = 0
+    pipeline_metrics.start("convert_docx")
+
+    # ---- 3. Convert each DOCX to HTML ----
+    for docx_path in docx_paths:
+        if not docx_path.exists():
+            print(f"[SKIPPED] File not found → {docx_path}")
+            pipeline_metrics.increment("convert_docx", "skipped")
+            continue
+
+        try:
+            stats = {"images": 0, "saved_bytes": 0}
+            with pipeline_metrics.timed("convert_docx"), pipeline_metrics.profile("convert_docx"):
+                with open(docx_path, "rb") as docx_file:
+                    result = mammoth.convert_to_html(
+                        docx_file,
+                        convert_image=make_image_converter(image_mode, docx_path.stem, stats),
+                    )
+                    html = result.value
+
+                # Output filename = same as DOCX but .html
+                output_file = output_folder / (docx_path.stem + ".html")
+
+                with open(output_file, "w", encoding="utf-8") as html_file:
+                    html_file.write(html)
+
+            pipeline_metrics.increment("convert_docx", "bytes_in", docx_path.stat().st_size)
+            pipeline_metrics.increment("convert_docx", "bytes_out", len(html.encode("utf-8")))
+            pipeline_metrics.increment("convert_docx", "images", stats["images"])
+            pipeline_metrics.increment("convert_docx", "image_bytes_saved", stats["saved_bytes"])
 
-    try:
-        with open(docx_path, "rb") as docx_file:
-            result = mammoth.convert_to_html(docx_file)
-            html = result.value
+            saved = ""
+            if stats["images"]:
+                total_saved += stats["saved_bytes"]
+                saved = (
+                    f" ({stats['images']} images {image_mode}: -{stats['saved_bytes'] / 1024:.1f} KiB,"
+                    f" ~{stats['saved_bytes'] // chars_per_token} tokens)"
+                )
+            print(f"[DONE] {docx_path} → {output_file}{saved}")
 
-        # Output filename = same as DOCX but .html
-        output_file = output_folder / (docx_path.stem + ".html")
+        except Exception as e:
+            print(f"[ERROR] Could not convert {docx_path}: {e}")
 
-        with open(output_file, "w", encoding="utf-8") as html_file:
-            html_file.write(html)
+    if image_mode != "keep":
+        print(
+            f"Images {image_mode}: saved {total_saved / 1024 / 1024:.1f} MiB of HTML,"
+            f" ~{total_saved // chars_per_token} prompt tokens"
+        )
 
-        print(f"[DONE] {docx_path} → {output_file}")
 
-    except Exception as e:
-        print(f"[ERROR] Could not convert {docx_path}: {e}")
+if __name__ == "__main__":
+    main()
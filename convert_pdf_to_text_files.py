@@ -1,35 +1,54 @@
 from pathlib import Path
 import pdfplumber  # pip install pdfplumber
 
+import pipeline_metrics
+
 # ---- 1. Read paths from the TXT file ----
 txt_file = Path("/opt/softwares/automations_and_data_pipelines/file_list_20251211_174207.txt")  # your PDF list file
 
-with open(txt_file, "r", encoding="utf-8") as f:
-    pdf_paths = [Path(line.strip()) for line in f if line.strip()]
-
-# ---- 2. Create output folder ----
+# ---- 2. Output folder ----
 output_folder = Path("data/text_outputs")
-output_folder.mkdir(parents=True, exist_ok=True)
 
-# ---- 3. Convert each PDF to TXT ----
-for pdf_path in pdf_paths:
-    if not pdf_path.exists():
-        print(f"[SKIPPED] File not found → {pdf_path}")
-        continue
 
-    try:
-        text_content = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text_content += page.extract_text() + "\n"
+def pdf_to_text(pdf_path: Path) -> str:
+    # Pages are separated by a form feed so long reports can be split per page
+    with pdfplumber.open(pdf_path) as pdf:
+        return "\f".join((page.extract_text() or "") + "\n" for page in pdf.pages)
+
+
+def main():
+    with open(txt_file, "r", encoding="utf-8") as f:
+        pdf_paths = [Path(line.strip()) for line in f if line.strip()]
+
+    output_folder.mkdir(parents=True, exist_ok=True)
+    pipeline_metrics.start("convert_pdf")
+
+    # ---- 3. Convert each PDF to TXT ----
+    for pdf_path in pdf_paths:
+        if not pdf_path.exists():
+            print(f"[SKIPPED] File not found → {pdf_path}")
+            pipeline_metrics.increment("convert_pdf", "skipped")
+            continue
+
+        try:
+            with pipeline_metrics.timed("convert_pdf"), pipeline_metrics.profile("convert_pdf"):
+                text_content = pdf_to_text(pdf_path)
+
+                # Output filename = same as PDF but .txt
+                output_file = output_folder / (pdf_path.stem + ".txt")
+
+                with open(output_file, "w", encoding="utf-8") as txt_file_out:
+                    txt_file_out.write(text_content)
+
+            pipeline_metrics.increment("convert_pdf", "bytes_in", pdf_path.stat().st_size)
+            pipeline_metrics.increment("convert_pdf", "bytes_out", len(text_content.encode("utf-8")))
+            pipeline_metrics.increment("convert_pdf", "pages", text_content.count("\f") + 1)
 
-        # Output filename = same as PDF but .txt
-        output_file = output_folder / (pdf_path.stem + ".txt")
+            print(f"[DONE] {pdf_path} → {output_file}")
 
-        with open(output_file, "w", encoding="utf-8") as txt_file:
-            txt_file.write(text_content)
+        except Exception as e:
+            print(f"[ERROR] Could not convert {pdf_path}: {e}")
 
-        print(f"[DONE] {pdf_path} → {output_file}")
 
-    except Exception as e:
-        print(f"[ERROR] Could not convert {pdf_path}: {e}")
+if __name__ == "__main__":
+    main()
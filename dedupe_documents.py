@@ -0,0 +1,126 @@
+import hashlib
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# ---- Input: a file list written by extract_all_file_names.py ----
+txt_file = Path("/opt/softwares/automations_and_data_pipelines/docx_file_list_20251211_094304.txt")
+
+# ---- Outputs (next to the input list) ----
+# Unique list → feed this to the converters instead of the full list
+unique_list_file = txt_file.with_name(txt_file.stem + "_unique.txt")
+# {canonical path: [every path with identical content]} → used by the extractors to fan results out
+duplicates_file = txt_file.with_name(txt_file.stem + "_duplicates.json")
+
+max_workers = 8
+chunk_size = 1024 * 1024  # 1 MiB reads
+
+
+# ------------------------------------------------------------------
+# HASHING
+# ------------------------------------------------------------------
+def hash_file(path: Path, limit: int = None) -> str:
+    """SHA-256 of the file contents, read in chunks. `limit` hashes only the first bytes."""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while True:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            if size == 0:
+                break
+            chunk = f.read(size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def group_by(paths, keys):
+    """Group paths by their key, keeping only groups with 2+ members."""
+    groups = defaultdict(list)
+    for path, key in zip(paths, keys):
+        groups[key].append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def find_duplicates(paths, workers: int = max_workers):
+    """
+    Returns a list of groups of paths with identical content.
+    Files are first grouped by size (free), then by a hash of their first
+    chunk, and only the survivors larger than one chunk are hashed in full.
+    Each pass submits every file to the pool at once.
+    """
+    sizes = {}
+    for path in paths:
+        try:
+            sizes[path] = path.stat().st_size
+        except OSError as e:
+            print(f"[SKIPPED] {path}: {e}")
+
+    candidates = [path for group in group_by(sizes, sizes.values()) for path in group]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        heads = pool.map(lambda p: hash_file(p, limit=chunk_size), candidates)
+        head_groups = group_by(candidates, [(sizes[p], head) for p, head in zip(candidates, heads)])
+
+        # The head hash already covers files of up to one chunk
+        duplicates = [group for group in head_groups if sizes[group[0]] <= chunk_size]
+        large = [path for group in head_groups if sizes[group[0]] > chunk_size for path in group]
+        full = pool.map(hash_file, large)
+        duplicates.extend(group_by(large, [(sizes[p], digest) for p, digest in zip(large, full)]))
+    return duplicates
+
+
+def load_duplicate_groups(path: Path) -> dict:
+    """
+    Read a duplicates file and key it by the canonical file's stem, which is
+    the name the converters give the HTML/TXT output.
+    Returns {stem: [all source paths]}.
+    """
+    if not path or not Path(path).exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        groups = json.load(f)
+    return {Path(canonical).stem: paths for canonical, paths in groups.items()}
+
+
+# ------------------------------------------------------------------
+# MAIN SCRIPT
+# ------------------------------------------------------------------
+def main():
+    with open(txt_file, "r", encoding="utf-8") as f:
+        paths = [Path(line.strip()) for line in f if line.strip()]
+
+    existing = [path for path in paths if path.exists()]
+    print(f"Checking {len(existing)} files for duplicate content ({len(paths) - len(existing)} missing)...")
+
+    # Shortest path wins as canonical ("Copy of ..." and nested copies lose)
+    groups = {}
+    for group in find_duplicates(existing):
+        group = sorted(group, key=lambda p: (len(str(p)), str(p)))
+        groups[str(group[0])] = [str(p) for p in group]
+
+    redundant = {p for group in groups.values() for p in group[1:]}
+    unique = [path for path in existing if str(path) not in redundant]
+
+    with open(unique_list_file, "w", encoding="utf-8") as f:
+        for path in unique:
+            f.write(str(path) + "\n")
+
+    with open(duplicates_file, "w", encoding="utf-8") as f:
+        json.dump(groups, f, indent=2, ensure_ascii=False)
+
+    saved_bytes = sum(Path(p).stat().st_size for p in redundant)
+    print(f"Found {len(groups)} groups of identical files ({len(redundant)} redundant copies)")
+    print(f"Saved {len(unique)} unique file paths to {unique_list_file}")
+    print(f"Duplicate map saved to {duplicates_file}")
+    print(
+        f"Work saved: {len(redundant)} conversions and {len(redundant)} extraction API calls "
+        f"({saved_bytes / 1024 / 1024:.1f} MiB not re-read)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,119 @@
-from pathlib import Path
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from pathlib import Path
 
 root_folder = Path("/media/martin/NO NAME/Ultrasound reports/")
 
-# Collect all files (excluding ~$ temp files)
-path_extension = ".doc"
-input_files = [
-    f for f in root_folder.rglob(f"*{path_extension}")
-    if not f.name.startswith("~$")
-]
+# All extensions are matched in a single walk of the tree (case-insensitive)
+path_extensions = [".doc", ".docx", ".pdf"]
+
+# Directories are listed concurrently; helps a lot on slow USB media
+max_workers = 16
+
+# size/mtime of every file seen so far, so later runs only list new or changed files
+manifest_file = Path("file_manifest.json")
+incremental = True
+
+
+# ------------------------------------------------------------------
+# SCANNING
+# ------------------------------------------------------------------
+def scan_directory(path: str, extensions: set):
+    """List one directory. Returns (matching files, subdirectories)."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    # Skip ~$ temp files left behind by Word
+                    if entry.name.startswith("~$") or not entry.is_file(follow_symlinks=False):
+                        continue
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext in extensions:
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, ext, stat.st_size, stat.st_mtime))
+                except OSError as e:
+                    print(f"[SKIPPED] {entry.path}: {e}")
+    except OSError as e:
+        print(f"[SKIPPED] Could not list {path}: {e}")
+    return files, subdirs
+
+
+def scan_tree(root: Path, extensions, workers: int = max_workers):
+    """Walk the whole tree once, listing directories on a thread pool."""
+    extensions = {ext.lower() for ext in extensions}
+    found = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(scan_directory, str(root), extensions)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                found.extend(files)
+                pending.update(pool.submit(scan_directory, d, extensions) for d in subdirs)
+    return sorted(found)
+
+
+# ------------------------------------------------------------------
+# MANIFEST
+# ------------------------------------------------------------------
+def load_manifest(path: Path, root: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get(str(root), {})
+
+
+def save_manifest(path: Path, root: Path, entries: dict):
+    data = {}
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    data[str(root)] = entries
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# ------------------------------------------------------------------
+# MAIN SCRIPT
+# ------------------------------------------------------------------
+def main():
+    found = scan_tree(root_folder, path_extensions)
+    previous = load_manifest(manifest_file, root_folder) if incremental else {}
+
+    current = {}
+    by_extension = {ext.lower(): [] for ext in path_extensions}
+    for path, ext, size, mtime in found:
+        current[path] = [size, mtime]
+        if previous.get(path) != [size, mtime]:
+            by_extension[ext].append(path)
+
+    # Create a unique filename using timestamp, one list per extension
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for ext, paths in by_extension.items():
+        if not paths:
+            print(f"No new or changed {ext} files")
+            continue
+        output_file = Path(f"file_list_{ext.lstrip('.')}_{timestamp}.txt")
+
+        # Write results to the text file
+        with open(output_file, "w", encoding="utf-8") as f:
+            for path in paths:
+                f.write(path + "\n")
+
+        print(f"Saved {len(paths)} {ext} file paths to {output_file}")
 
-# Create a unique filename using timestamp
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-output_file = Path(f"file_list_{timestamp}.txt")
+    save_manifest(manifest_file, root_folder, current)
+    removed = len(set(previous) - set(current))
+    print(f"Scanned {len(found)} files ({removed} removed since last run). Manifest: {manifest_file}")
 
-# Write results to the text file
-with open(output_file, "w", encoding="utf-8") as f:
-    for path in input_files:
-        f.write(str(path) + "\n")
 
-print(f"Saved {len(input_files)} file paths to {output_file}")
+if __name__ == "__main__":
+    main()
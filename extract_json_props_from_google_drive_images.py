@@ -1,26 +1,27 @@
+import argparse
+import csv
 import os
-import io
 import uuid
 import json
 import requests
-import pandas as pd
 from io import BytesIO
 
-# Google Drive API
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from googleapiclient.errors import HttpError
+import pipeline_metrics
+
+# googleapiclient and the Google auth libraries are imported inside the
+# functions that need them, so importing this module stays fast
 
 
 # -------------------------------
 # CONFIG
 # -------------------------------
 VA_API_KEY = os.getenv("VA_API_KEY")
+VA_API_URL = os.getenv("VA_API_URL", "https://api.va.landing.ai")
 headers = {"Authorization": f"Basic {VA_API_KEY}"}
 
+# Point the Drive client at another endpoint (e.g. fake_services.py); skips OAuth
+DRIVE_API_ENDPOINT = os.getenv("DRIVE_API_ENDPOINT")
+
 GOOGLE_CLIENT_SECRET = "credentials.json"
 SCOPES = [
     'https://www.googleapis.com/auth/drive',
@@ -36,29 +37,50 @@ DEST_FOLDER_ID = "1unblcJoVK5LWrPhNtgYD4qrkGcMy7KgJ"    # Destination folder aft
 
 DOWNLOAD_DIR = "downloaded"
 CSV_PATH = f"results_{str(uuid.uuid4())}.csv"
+CSV_COLUMNS = ["filename", "extracted_json"]
 
 # Landing AI extraction schema
 SCHEMA_PATH = "schema.json"
-with open(SCHEMA_PATH, "r") as f:
-    schema = json.load(f)
+
+
+def load_schema(path: str = SCHEMA_PATH) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
 
 # -------------------------------
 # GOOGLE DRIVE AUTHENTICATION
 # -------------------------------
-creds = None
-if os.path.exists("token.json"):
-    creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+def get_drive_service():
+    """Build the Drive v3 client, running the OAuth flow if token.json is missing or stale."""
+    from googleapiclient.discovery import build
+
+    if DRIVE_API_ENDPOINT:
+        from google.auth.credentials import AnonymousCredentials
+        return build(
+            "drive", "v3",
+            credentials=AnonymousCredentials(),
+            client_options={"api_endpoint": DRIVE_API_ENDPOINT},
+        )
 
-if not creds or not creds.valid:
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-    else:
-        flow = InstalledAppFlow.from_client_secrets_file(GOOGLE_CLIENT_SECRET, SCOPES)
-        creds = flow.run_local_server(port=0)
-    with open("token.json", "w") as token:
-        token.write(creds.to_json())
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    creds = None
+    if os.path.exists("token.json"):
+        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(GOOGLE_CLIENT_SECRET, SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open("token.json", "w") as token:
+            token.write(creds.to_json())
 
-service = build("drive", "v3", credentials=creds)
+    return build("drive", "v3", credentials=creds)
 
 
 
@@ -66,54 +88,89 @@ service = build("drive", "v3", credentials=creds)
 # MOVE FILE FUNCTION
 #-----------------
 def move_file(service, file_id, remove_parent_id, add_parent_id):
+    from googleapiclient.errors import HttpError
+
     try:
         # Get current parents FIRST (critical step you might be missing)
         file = service.files().get(fileId=file_id, fields='parents').execute()
         previous_parents = ",".join(file.get('parents', []))
-        
+
         # Move file using update with query params only
-        updated_file = service.files().update(
-            fileId=file_id,
-            addParents=add_parent_id,
-            removeParents=previous_parents,
-            fields='id, parents'
-        ).execute()
-        
+        with pipeline_metrics.timed("move"):
+            updated_file = service.files().update(
+                fileId=file_id,
+                addParents=add_parent_id,
+                removeParents=previous_parents,
+                fields='id, parents'
+            ).execute()
+
         print(f"✅ Moved file {file_id} to folder {add_parent_id}")
         print(f"New parents: {updated_file.get('parents')}")
         return updated_file
-        
+
     except HttpError as error:
         print(f"❌ Failed to move file: {error}")
 
 
+def download_file(service, file_id, file_path):
+    from googleapiclient.http import MediaIoBaseDownload
 
+    request = service.files().get_media(fileId=file_id)
+    with pipeline_metrics.timed("download"), open(file_path, "wb") as fh:
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while not done:
+            status, done = downloader.next_chunk()
+            if status:
+                print(f" → {int(status.progress() * 100)}%")
+    pipeline_metrics.increment("download", "bytes_in", os.path.getsize(file_path))
+
+
+def extract_with_landing_ai(file_path, schema):
+    """Landing AI parse → extract. Returns (success, extracted_json)."""
+    # Parse
+    with pipeline_metrics.timed("landingai_parse"), pipeline_metrics.profile("landingai"):
+        parse_response = requests.post(
+            f"{VA_API_URL}/v1/ade/parse",
+            headers=headers,
+            files=[("document", open(file_path, "rb"))],
+            data={"model": "dpt-2"},
+            timeout=120,
+        )
+        parse_response.raise_for_status()
+        markdown_content = parse_response.json().get("markdown", "")
+    pipeline_metrics.increment("landingai_parse", "bytes_in", os.path.getsize(file_path))
+    pipeline_metrics.increment("landingai_parse", "bytes_out", len(parse_response.content))
 
-# -------------------------------
-# LIST FILES IN SOURCE FOLDER
-# -------------------------------
-query = f"'{SOURCE_FOLDER_ID}' in parents and trashed = false"
-results = service.files().list(q=query, fields="files(id, name, parents)").execute()
-files = results.get("files", [])
+    # Extract
+    with pipeline_metrics.timed("landingai_extract"), pipeline_metrics.profile("landingai"):
+        extract_response = requests.post(
+            f"{VA_API_URL}/v1/ade/extract",
+            headers=headers,
+            files=[("markdown", BytesIO(markdown_content.encode("utf-8")))],
+            data={"schema": json.dumps(schema)},
+            timeout=120,
+        )
+        extracted_json = extract_response.json()
+    pipeline_metrics.increment("landingai_extract", "bytes_in", len(markdown_content.encode("utf-8")))
+    pipeline_metrics.increment("landingai_extract", "bytes_out", len(extract_response.content))
 
-if not files:
-    print("No files found in the source Drive folder.")
-    exit()
+    if extract_response.status_code in [200, 201, 206]:
+        return True, extracted_json
+    pipeline_metrics.increment("landingai_extract", f"status_{extract_response.status_code}")
+    return False, extracted_json
 
-print(f"Found {len(files)} PDF files")
 
-# -------------------------------
-# PREP CSV (header once)
-# -------------------------------
-pd.DataFrame(columns=["filename", "extracted_json"]).to_csv(CSV_PATH, index=False)
+def append_row(csv_path, row):
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=CSV_COLUMNS).writerow(row)
 
-df_rows = []
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
 # -------------------------------
-# PROCESS EACH PDF
+# PROCESS ONE PDF
 # -------------------------------
-for f in files:
+def process_file(service, f, schema, csv_path, download_dir=DOWNLOAD_DIR, dest_folder_id=DEST_FOLDER_ID):
+    """Download, extract, save, move and clean up one Drive file. Returns the CSV row or None."""
     file_id = f["id"]
     file_name = f["name"]
     current_parents = f.get("parents", [])
@@ -124,20 +181,13 @@ for f in files:
     # 1. DOWNLOAD PDF
     # -------------------------------
     print(f"Downloading: {file_name}")
-    request = service.files().get_media(fileId=file_id)
-    file_path = os.path.join(DOWNLOAD_DIR, file_name)
+    file_path = os.path.join(download_dir, file_name)
 
     try:
-        with open(file_path, "wb") as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                if status:
-                    print(f" → {int(status.progress() * 100)}%")
+        download_file(service, file_id, file_path)
     except Exception as e:
         print(f"Error downloading {file_name}: {e}")
-        continue
+        return None
 
     # -------------------------------
     # 2. LANDING.AI PARSE → EXTRACT
@@ -147,44 +197,22 @@ for f in files:
     extracted_json = None
 
     try:
-        # Parse
-        parse_response = requests.post(
-            "https://api.va.landing.ai/v1/ade/parse",
-            headers=headers,
-            files=[("document", open(file_path, "rb"))],
-            data={"model": "dpt-2"},
-            timeout=120,
-        )
-        parse_response.raise_for_status()
-        markdown_content = parse_response.json().get("markdown", "")
-
-        # Extract
-        extract_response = requests.post(
-            "https://api.va.landing.ai/v1/ade/extract",
-            headers=headers,
-            files=[("markdown", BytesIO(markdown_content.encode("utf-8")))],
-            data={"schema": json.dumps(schema)},
-            timeout=120,
-        )
-        extracted_json = extract_response.json()
-        
-        if extract_response.status_code in [200, 201, 206]:
-            success = True
-
+        success, extracted_json = extract_with_landing_ai(file_path, schema)
     except Exception as e:
         print(f"Landing AI API error for {file_name}: {e}")
 
     # -------------------------------
     # 3. SAVE RESULT TO CSV (if successful)
     # -------------------------------
+    row = None
     if success and extracted_json:
         row = {
             "filename": file_name,
             "extracted_json": json.dumps(extracted_json)
         }
-        df_rows.append(row)
         try:
-            pd.DataFrame([row]).to_csv(CSV_PATH, mode="a", header=False, index=False)
+            append_row(csv_path, row)
+            pipeline_metrics.increment("output", "rows")
             print(f"✔ Saved extracted data for: {file_name}")
         except Exception as e:
             print(f"Error writing {file_name} to CSV: {e}")
@@ -195,11 +223,11 @@ for f in files:
         print(f"Moving {file_name} to destination folder...")
         try:
             # Move file: remove current parents, add destination folder
-            move_file(service, file_id, current_parents[0], DEST_FOLDER_ID)
-            
+            move_file(service, file_id, current_parents[0], dest_folder_id)
+
         except Exception as e:
             print(f"❌ Failed to move {file_name}: {e}")
-    
+
     # -------------------------------
     # 5. DELETE LOCAL PDF
     # -------------------------------
@@ -212,16 +240,67 @@ for f in files:
     else:
         print(f"⚠️ Local file not found for deletion: {file_name}")
 
+    return row
+
+
 # -------------------------------
-# FINAL SUMMARY
+# ENTRY POINT
 # -------------------------------
-df = pd.DataFrame(df_rows)
-print(f"\n🎉 Processing complete!")
-print(f"Results saved to: {CSV_PATH}")
-print(f"Successfully processed: {len(df_rows)} / {len(files)} files")
-if len(df) > 0:
-    print("\nFirst few results:")
-    print(df.head())
-else:
-    print("No files were successfully processed.")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract Drive PDFs with Landing AI and move them when done.")
+    parser.add_argument("--source-folder", default=SOURCE_FOLDER_ID, help="Drive folder id to process")
+    parser.add_argument("--dest-folder", default=DEST_FOLDER_ID, help="Drive folder id processed files move to")
+    parser.add_argument("--schema", default=SCHEMA_PATH, help="Landing AI extraction schema")
+    parser.add_argument("--download-dir", default=DOWNLOAD_DIR)
+    parser.add_argument("--output", default=CSV_PATH, help="results CSV")
+    args = parser.parse_args(argv)
+
+    schema = load_schema(args.schema)
+    service = get_drive_service()
+
+    # -------------------------------
+    # LIST FILES IN SOURCE FOLDER
+    # -------------------------------
+    query = f"'{args.source_folder}' in parents and trashed = false"
+    results = service.files().list(q=query, fields="files(id, name, parents)").execute()
+    files = results.get("files", [])
+
+    if not files:
+        print("No files found in the source Drive folder.")
+        return
+
+    print(f"Found {len(files)} PDF files")
+    pipeline_metrics.start("drive")
+
+    # -------------------------------
+    # PREP CSV (header once)
+    # -------------------------------
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=CSV_COLUMNS).writeheader()
+
+    os.makedirs(args.download_dir, exist_ok=True)
+
+    rows = []
+    for index, f in enumerate(files):
+        pipeline_metrics.set_gauge("drive", "queue_pending", len(files) - index)
+        row = process_file(service, f, schema, args.output, args.download_dir, args.dest_folder)
+        if row:
+            rows.append(row)
+
+    # -------------------------------
+    # FINAL SUMMARY
+    # -------------------------------
+    pipeline_metrics.set_gauge("drive", "queue_pending", 0)
+    print(f"\n🎉 Processing complete!")
+    print(f"Results saved to: {args.output}")
+    print(f"Successfully processed: {len(rows)} / {len(files)} files")
+    if rows:
+        print("\nFirst few results:")
+        for row in rows[:5]:
+            print(f"{row['filename']}: {row['extracted_json'][:100]}")
+    else:
+        print("No files were successfully processed.")
+
 
+if __name__ == "__main__":
+    main()
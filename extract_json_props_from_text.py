@@ -1,76 +1,121 @@
+import argparse
+import csv
 import time
 import os
 import uuid
 import json
 import logging
+from functools import partial
 from pathlib import Path
-import pandas as pd
-from datetime import datetime
-from openai import OpenAI
-from openai import OpenAI, RateLimitError, APIConnectionError, APIStatusError, APIError
-
-
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from dedupe_documents import load_duplicate_groups
+import near_duplicate_index
+from near_duplicate_index import NearDuplicateIndex
+from chunked_extraction import extract_in_chunks
+from rule_based_extraction import choose_model, fill_missing, format_stats, new_stats, pre_extract, record_routing
+from request_scheduler import all_schedulers, estimate_tokens, scheduler_for
+from work_queue import WorkQueue, default_worker_id
+import pipeline_metrics
 
 
 # ------------------- OpenAI Client -------------------
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 max_retries = 3
 retry_delay = 2  # seconds
-
-# ------------------- Logging -------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+# Documents in flight at once; request_scheduler keeps them under the RPM/TPM quota
+max_concurrent_documents = 8
+_client = None
 
 # ------------------- Paths -------------------
-text_folder = Path("/opt/softwares/automations_and_data_pipelines/data/text_outputs/")  # folder containing text files
+text_folder = Path(os.getenv("TEXT_FOLDER", "/opt/softwares/automations_and_data_pipelines/data/text_outputs/"))  # folder containing text files
 json_schema_file = Path("external_labresult_schema.json")  # external JSON schema file
 csv_output = Path(f"external_lab_results_{uuid.uuid4().hex}.csv")
+# source_file is always the converted file; original_path is the DOCX/PDF it came from when a duplicate map is used
+csv_columns = ["patient_name", "json_record", "source_file", "original_path"]
+
+# Duplicate map from dedupe_documents.py (None to disable): one extraction is fanned out to every copy
+duplicates_file = None  # e.g. Path("docx_file_list_20251211_094304_duplicates.json")
+
+# MinHash/LSH index of already-extracted documents: near-identical ones reuse the result
+near_duplicate_index_file = near_duplicate_index.index_files["text"]  # also what near_duplicate_index.py main() updates
+save_index_every = 50
+# How long a document waits for a near-identical one that is being extracted before extracting itself
+in_flight_wait_seconds = 600
+near_duplicates_lock = Lock()
+
+
+def get_client():
+    """The OpenAI client, created on first use so importing this module stays fast."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        # SDK retries are off: the loop below retries through the rate-limit scheduler
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return _client
 
-# Load JSON schema from file
-with open(json_schema_file, "r", encoding="utf-8") as f:
-    json_schema = json.load(f)
 
 # ------------------- LLM Extraction Function -------------------
-def extract_lab_result_from_text(text: str,retry_delay=2,max_retries=3) -> dict:
+def extract_lab_result_from_text(text: str, json_schema: dict, retry_delay=2, max_retries=3, model="gpt-4o-mini") -> dict:
     """
-    Uses GPT-4o-mini to extract LabResult JSON from text text.
-    Returns a dictionary matching the JSON schema loaded from file.
+    Uses GPT-4o-mini (or the given model) to extract LabResult JSON from text text.
+    Returns a dictionary matching the given JSON schema.
+    Requests are paced by the model's RateLimitScheduler.
     """
+    from openai import RateLimitError, APIConnectionError, APIStatusError, APIError
+
     system_prompt = (
         "You are an assistant that extracts structured lab result data "
-        "from text medical reports. Return only valid JSON matching the following schema:\n"
+        "from text medical reports. The input may be one part of a longer report; "
+        "extract only what it contains. Return only valid JSON matching the following schema:\n"
         f"{json.dumps(json_schema, indent=2)}"
     )
+    user_prompt = f"Extract lab result from the following text:\n\n{text}"
+    scheduler = scheduler_for(model)
+    estimated_tokens = estimate_tokens(system_prompt + user_prompt)
 
-
+    response = None
     for attempt in range(1, max_retries + 1):
+        if attempt > 1:
+            pipeline_metrics.increment("openai", "retries")
+        with pipeline_metrics.timed("scheduler_wait"):
+            scheduler.acquire(estimated_tokens)
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Extract lab result from the following text:\n\n{text}"}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0
-            )
+            with pipeline_metrics.timed("openai"):
+                raw_response = get_client().chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0
+                )
+            scheduler.update_from_headers(raw_response.headers)
+            response = raw_response.parse()
+            if response.usage:
+                pipeline_metrics.increment("openai", "tokens_prompt", response.usage.prompt_tokens)
+                pipeline_metrics.increment("openai", "tokens_completion", response.usage.completion_tokens)
 
             # If no exception, break out of retry loop
             break
 
         except RateLimitError as e:
-            print(f"Rate limit hit (429). Attempt {attempt}/{max_retries}. Retrying in {retry_delay} sec...")
-            time.sleep(retry_delay)
-            retry_delay *= 2  # exponential backoff
+            delay = scheduler.rate_limited(e.response.headers, retry_delay)
+            pipeline_metrics.increment("openai", "rate_limited")
+            logging.warning(f"Rate limit hit (429). Attempt {attempt}/{max_retries}. Dispatch paused for {delay:.1f} sec")
+            retry_delay *= 2  # exponential backoff when the headers give no reset time
         except APIConnectionError as e:
-            # network/connectivity issue
-            raise Exception(f"API connection error: {e}")
+            # network/connectivity issue (includes timeouts): retry
+            logging.warning(f"API connection error: {e}. Attempt {attempt}/{max_retries}. Retrying in {retry_delay} sec")
+            time.sleep(retry_delay)
+            retry_delay *= 2
         except APIStatusError as e:
-            # non-200-range status code (4xx, 5xx)
-            raise Exception(f"API status error: {e}")
+            # non-200-range status code: 5xx is transient, 4xx is not
+            if e.status_code < 500:
+                raise Exception(f"API status error: {e}")
+            logging.warning(f"API status error {e.status_code}. Attempt {attempt}/{max_retries}. Retrying in {retry_delay} sec")
+            time.sleep(retry_delay)
+            retry_delay *= 2
         except APIError as e:
             # fallback for all other API‑related errors
             raise Exception(f"OpenAI API error: {e}")
@@ -78,49 +123,212 @@ def extract_lab_result_from_text(text: str,retry_delay=2,max_retries=3) -> dict:
             # Catch anything else
             raise Exception(f"Unexpected error: {e}")
 
+    if response is None:
+        raise Exception(f"OpenAI request failed after {max_retries} attempts")
+
     try:
         output_text = response.choices[0].message.content
         return json.loads(output_text)
     except json.JSONDecodeError as e:
         raise ValueError(f"Failed to parse JSON from LLM output: {e}\nOutput: {output_text}")
 
-# ------------------- Process text Files -------------------
-text_files = list(text_folder.glob("*.txt"))
-logging.info(f"Found {len(text_files)} text files to process.")
 
-# Flag to write header only once
-write_header = True
+def extract_record(text_file: Path, text: str, json_schema: dict, routing_stats: dict) -> dict:
+    """Extract one document with the rules, and with the LLM if they couldn't complete it."""
+    # Deterministic rules first; only incomplete documents go to the LLM
+    rule_record, complete = pre_extract(text, json_schema, kind="text")
+    model = None if complete else choose_model(text)
+    with near_duplicates_lock:
+        record_routing(routing_stats, text, len(json.dumps(json_schema, indent=2)), complete, model)
+    if complete:
+        logging.info(f"All required fields of {text_file.name} extracted by rules, skipping LLM")
+        pipeline_metrics.increment("extract", "rules_only")
+        return rule_record
 
-for text_file in text_files:
-    try:
+    pipeline_metrics.increment("extract", f"llm_{model}")
+    extract = partial(extract_lab_result_from_text, json_schema=json_schema, model=model)
+    json_record = extract_in_chunks(text, extract, json_schema, kind="text")
+    return fill_missing(json_record, rule_record)
+
+
+def extract_file(text_file: Path, json_schema: dict, near_duplicates: NearDuplicateIndex, routing_stats: dict) -> dict:
+    """
+    Read one document and extract its record, reusing the result of a
+    near-identical document when reusable_diff() allows it. If such a
+    document is still being extracted by another thread, wait for it
+    rather than extracting the same report twice.
+    """
+    with pipeline_metrics.timed("extract"), pipeline_metrics.profile("extract_file"):
         logging.info(f"Processing file: {text_file.name}")
         text = text_file.read_text(encoding="utf-8")
+        pipeline_metrics.increment("extract", "bytes_in", text_file.stat().st_size)
+
+        signature = near_duplicates.signature(text)
+        cached = None
+        while signature is not None:
+            with near_duplicates_lock:
+                cached = near_duplicates.cached_result(signature, text)
+                pending = None if cached else near_duplicates.in_flight_match(signature, text)
+                if cached is None and pending is None:
+                    near_duplicates.begin(text_file.name, signature, text)
+            if pending is None:
+                break
+            logging.info(f"Waiting for a near-identical document of {text_file.name} being extracted")
+            pipeline_metrics.increment("extract", "near_duplicate_waits")
+            if not pending.wait(in_flight_wait_seconds):
+                break
+
+        json_record = None
+        try:
+            if cached:
+                logging.info(f"Reusing result of {cached[0]} (similarity {cached[1]:.2f})")
+                pipeline_metrics.increment("extract", "near_duplicate_reused")
+                json_record = cached[2]
+            else:
+                json_record = extract_record(text_file, text, json_schema, routing_stats)
+            return json_record
+        finally:
+            # Store the result right away (not when the row is written) and wake any waiting documents
+            with near_duplicates_lock:
+                near_duplicates.finish(text_file.name, signature, json_record, text)
+
+
+def append_rows(path: Path, rows: list, write_header: bool):
+    """Append result rows to the output CSV."""
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=csv_columns)
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+# ------------------- Process text Files -------------------
+def process_folder(folder: Path, json_schema: dict, output: Path, worker_id: str,
+                   duplicates: Path = None, workers: int = max_concurrent_documents):
+    """
+    Extract every text file of folder into output through the shared lease
+    queue (folder/extraction_queue.sqlite), so several processes/hosts can
+    work on the same folder at once.
+    """
+    duplicate_groups = load_duplicate_groups(duplicates)
+    near_duplicates = NearDuplicateIndex.load(near_duplicate_index_file)
+    routing_stats = new_stats()
+
+    # Every worker enqueues what it sees (existing keys are ignored unless done and the file is newer),
+    # then claims items one by one. Largest documents get the highest priority, so the small ones fill
+    # the leftover token budget at the end
+    queue = WorkQueue(folder / "extraction_queue.sqlite")
+    files = []
+    for text_file in folder.glob("*.txt"):
+        try:
+            files.append((text_file.name, text_file.stat()))
+        except FileNotFoundError:
+            # Another worker processed and deleted it since the glob
+            continue
+    new_items = queue.enqueue((key, stat.st_size, stat.st_mtime) for key, stat in files)
+    logging.info(f"Queued {new_items} new text files. Queue: {queue.stats()}")
+
+    # Flag to write header only once
+    write_header = True
+    # Documents finished (successfully or not) by this worker; the index is saved every save_index_every
+    finished = 0
+
+    # Named threads so py-spy dump/record --threads output is readable
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as pool:
+        in_flight = {}
+        while True:
+            # Keep the pool full with freshly claimed items
+            while len(in_flight) < workers:
+                key = queue.claim(worker_id)
+                if key is None:
+                    break
+                future = pool.submit(extract_file, folder / key, json_schema, near_duplicates, routing_stats)
+                in_flight[future] = key
+            queue_stats = queue.stats()
+            for status in ("pending", "leased", "failed", "stalled"):
+                pipeline_metrics.set_gauge("queue", f"queue_{status}", queue_stats[status])
+            pipeline_metrics.set_gauge("queue", "in_flight", len(in_flight))
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, timeout=queue.lease_seconds / 3, return_when=FIRST_COMPLETED)
+            for key in in_flight.values():
+                if not queue.renew(key, worker_id):
+                    logging.warning(f"Lease on {key} expired; another worker may pick it up")
+
+            for future in done:
+                key = in_flight.pop(future)
+                text_file = folder / key
+                finished += 1
+                if finished % save_index_every == 0:
+                    # Only the copy is taken under the lock; the workers keep going while it is written
+                    with near_duplicates_lock:
+                        snapshot = near_duplicates.snapshot()
+                    near_duplicates.save(near_duplicate_index_file, snapshot)
+                try:
+                    json_record = future.result()
+
+                    # One row per original file (identical copies share the result)
+                    original_paths = duplicate_groups.get(text_file.stem, [""])
+                    rows = [{
+                        "patient_name": json_record.get("patient_name", ""),
+                        "json_record": json.dumps(json_record, ensure_ascii=False),
+                        "source_file": text_file.name,
+                        "original_path": original_path
+                    } for original_path in original_paths]
+
+                    # Append to CSV incrementally
+                    append_rows(output, rows, write_header)
+                    pipeline_metrics.increment("output", "rows", len(rows))
+                    write_header = False  # after first write, don't write header again
+                    queue.complete(key, worker_id)
+
+                    logging.info(f"Successfully processed {text_file.name}")
+                    try:
+                        os.remove(text_file)
+                        print(f"🗑️  Deleted local file: {text_file.name}")
+                    except FileNotFoundError:
+                        print(f"⚠️ Local file not found for deletion: {text_file.name}")
+                    except Exception as e:
+                        print(f"Error deleting local {text_file.name}: {e}")
+
+                except Exception as e:
+                    queue.fail(key, worker_id, e)
+                    logging.error(f"Error processing {text_file.name}: {e}", exc_info=True)
+
+    logging.info(f"Queue: {queue.stats()}")
+    queue.close()
+    near_duplicates.save(near_duplicate_index_file)
+    logging.info(format_stats(routing_stats))
+    for model, scheduler in all_schedulers().items():
+        logging.info(f"{model}: {scheduler.summary()}")
+
+
+# ------------------- Entry Point -------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract lab results from text files with rules and OpenAI.")
+    parser.add_argument("folder", nargs="?", type=Path, default=text_folder, help="folder containing text files")
+    parser.add_argument("--schema", type=Path, default=json_schema_file, help="JSON schema of a lab result")
+    parser.add_argument("--duplicates", type=Path, default=duplicates_file, help="duplicate map from dedupe_documents.py")
+    parser.add_argument("--output", type=Path, default=csv_output, help="CSV the results are appended to")
+    parser.add_argument("--workers", type=int, default=max_concurrent_documents, help="documents in flight at once")
+    parser.add_argument("--worker-id", default=None, help="queue worker id (default: host:pid)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    # Load JSON schema from file
+    with open(args.schema, "r", encoding="utf-8") as f:
+        json_schema = json.load(f)
+
+    pipeline_metrics.start("extract_text")
+    process_folder(args.folder, json_schema, args.output, args.worker_id or default_worker_id(),
+                   args.duplicates, args.workers)
+    logging.info(f"All files processed. Results saved to {args.output}")
+
 
-        # Extract JSON via GPT-4o-mini
-        json_record = extract_lab_result_from_text(text)
-
-        # Create DataFrame for current row
-        df_row = pd.DataFrame([{
-            "patient_name": json_record.get("patient_name", ""),
-            "json_record": json.dumps(json_record, ensure_ascii=False)
-        }])
-
-        # Append to CSV incrementally
-        df_row.to_csv(csv_output, mode="a", index=False, header=write_header, encoding="utf-8")
-        write_header = False  # after first write, don't write header again
-
-        logging.info(f"Successfully processed {text_file.name}")
-        file_path_to_remove = text_folder/text_file.name
-        if os.path.exists(file_path_to_remove):
-            try:
-                os.remove(file_path_to_remove)
-                print(f"🗑️  Deleted local file: {text_file.name}")
-            except Exception as e:
-                print(f"Error deleting local {text_file.name}: {e}")
-        else:
-            print(f"⚠️ Local file not found for deletion: {text_file.name}")
-
-    except Exception as e:
-        logging.error(f"Error processing {text_file.name}: {e}", exc_info=True)
-
-logging.info(f"All files processed. Results saved to {csv_output}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Defaults for local stand-ins of OpenAI, Landing AI and Google Drive
+default_latency_ms = 200
+default_jitter_ms = 100
+default_error_rate = 0.0       # fraction of requests answered with a 500
+default_rate_limit_rate = 0.0  # fraction of requests answered with a 429
+
+_NAME_RE = re.compile(r"Patient Name:\s*([A-Za-z .'\-]+?)\s*(?:<|\n|$)")
+_TEST_ROW_RE = re.compile(r"<td>([A-Za-z][^<]{0,40})</td><td>([\d.]+)</td><td>([^<]*)</td><td>([^<]*)</td>")
+_TEXT_ROW_RE = re.compile(r"(?m)^([A-Za-z][A-Za-z0-9 ()/%.\-]{0,40}?) {2,}([\d.]+) {2,}(\S*) {2,}(\S*)$")
+_PDF_TEXT_RE = re.compile(rb"\(((?:\\.|[^\\)])*)\)\s*Tj")
+
+
+def fake_record(document: str) -> dict:
+    """A plausible extraction result, built from the synthetic report layout."""
+    name = _NAME_RE.search(document)
+    tests = [
+        {"test_name": t, "result": v, "unit": u, "reference_range": r}
+        for t, v, u, r in _TEST_ROW_RE.findall(document) + _TEXT_ROW_RE.findall(document)
+    ]
+    return {"patient_name": name.group(1) if name else "Unknown", "tests": tests}
+
+
+class FakeServices:
+    """
+    One local HTTP server answering the OpenAI chat completions API, the
+    Landing AI parse/extract API and the small part of the Drive v3 API
+    the pipelines use, with configurable latency and error rates.
+    Drive serves the files of drive_folder and "moves" them by hiding them.
+    Per-request latencies are kept for the benchmark report.
+    """
+
+    def __init__(self, latency_ms: float = default_latency_ms, jitter_ms: float = default_jitter_ms,
+                 error_rate: float = default_error_rate, rate_limit_rate: float = default_rate_limit_rate,
+                 drive_folder: Path = None, seed: int = 0, port: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.drive_folder = Path(drive_folder) if drive_folder else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.moved = set()
+        self.requests = []  # (service, status, seconds)
+
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                services._handle(self, "GET")
+
+            def do_POST(self):
+                services._handle(self, "POST")
+
+            def do_PATCH(self):
+                services._handle(self, "PATCH")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ---------------- request plumbing ----------------
+    def _delay_and_fault(self):
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            roll = self._random.random()
+        time.sleep(delay)
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    @staticmethod
+    def _send(handler, status, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _handle(self, handler, method):
+        started = time.monotonic()
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        url = urlparse(handler.path)
+        service = "openai" if "/chat/completions" in url.path else "landingai" if "/ade/" in url.path else "drive"
+
+        fault = self._delay_and_fault()
+        if fault == 429:
+            status, response, headers = 429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {
+                "retry-after": "1", "x-ratelimit-reset-tokens": "1s"}
+            self._send(handler, status, response, headers=headers)
+        elif fault == 500:
+            status = 500
+            self._send(handler, status, {"error": {"message": "Internal error"}})
+        else:
+            status = self._route(handler, method, url, body, service)
+
+        with self._lock:
+            self.requests.append((service, status, time.monotonic() - started))
+
+    def _route(self, handler, method, url, body, service):
+        if service == "openai":
+            payload = json.loads(body)
+            prompt = "".join(m["content"] for m in payload["messages"])
+            content = json.dumps(fake_record(prompt))
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(content) // 4
+            self._send(handler, 200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }, headers={
+                "x-ratelimit-limit-requests": "10000",
+                "x-ratelimit-remaining-requests": "9999",
+                "x-ratelimit-limit-tokens": "10000000",
+                "x-ratelimit-remaining-tokens": "9990000",
+            })
+            return 200
+
+        if service == "landingai":
+            if url.path.endswith("/parse"):
+                lines = [m.decode("latin-1") for m in _PDF_TEXT_RE.findall(body)]
+                self._send(handler, 200, {"markdown": "\n".join(lines)})
+            else:
+                self._send(handler, 200, {"extraction": fake_record(body.decode("latin-1")), "metadata": {}})
+            return 200
+
+        return self._drive(handler, method, url)
+
+    def _drive(self, handler, method, url):
+        query = parse_qs(url.query)
+        match = re.search(r"/drive/v3/files(?:/([^/?]+))?", url.path)
+        if not match or self.drive_folder is None:
+            self._send(handler, 404, {"error": {"code": 404, "message": "Not found"}})
+            return 404
+        file_id = match.group(1)
+
+        if file_id is None:
+            files = [
+                {"id": p.name, "name": p.name, "parents": ["source"]}
+                for p in sorted(self.drive_folder.iterdir()) if p.is_file() and p.name not in self.moved
+            ]
+            self._send(handler, 200, {"files": files})
+            return 200
+
+        path = self.drive_folder / file_id
+        if not path.is_file():
+            self._send(handler, 404, {"error": {"code": 404, "message": "File not found"}})
+            return 404
+        if method == "PATCH":
+            with self._lock:
+                self.moved.add(file_id)
+            self._send(handler, 200, {"id": file_id, "parents": query.get("addParents", [])})
+        elif query.get("alt") == ["media"]:
+            self._send(handler, 200, path.read_bytes(), content_type="application/pdf")
+        else:
+            parents = ["destination"] if file_id in self.moved else ["source"]
+            self._send(handler, 200, {"id": file_id, "parents": parents})
+        return 200
+
+    def latencies(self, service: str) -> list:
+        with self._lock:
+            return [seconds for name, status, seconds in self.requests if name == service]
+
+    def status_counts(self, service: str) -> dict:
+        counts = {}
+        with self._lock:
+            for name, status, _ in self.requests:
+                if name == service:
+                    counts[str(status)] = counts.get(str(status), 0) + 1
+        return counts
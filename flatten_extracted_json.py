@@ -0,0 +1,222 @@
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from chunked_extraction import root_schema
+
+# ---- Result CSVs to flatten, with the JSON column and schema each was extracted with ----
+SOURCES = [
+    {
+        "name": "lab_results",
+        "csv_glob": "lab_results_*.csv",
+        "json_column": "json_record",
+        "schema": Path("labresult_schema.json"),
+    },
+    {
+        "name": "external_lab_results",
+        "csv_glob": "external_lab_results_*.csv",
+        "json_column": "json_record",
+        "schema": Path("external_labresult_schema.json"),
+    },
+    {
+        "name": "drive_results",
+        "csv_glob": "results_*.csv",
+        "json_column": "extracted_json",
+        "schema": Path("schema.json"),
+    },
+]
+results_folder = Path(".")
+output_folder = Path("data/parquet")
+
+# Columns we also split into numeric / range bounds for analysis
+VALUE_COLUMN_RE = re.compile(r"(?i)(^|_)(value|result|result_value)$")
+RANGE_COLUMN_RE = re.compile(r"(?i)range|reference")
+_NUMBER_RE = r"[<>]?\s*(-?\d+(?:\.\d+)?)"
+_RANGE_RE = r"(-?\d+(?:\.\d+)?)\s*[-–]\s*(-?\d+(?:\.\d+)?)"
+
+
+# ------------------------------------------------------------------
+# SCHEMA LAYOUT
+# ------------------------------------------------------------------
+def _schema_type(prop: dict):
+    declared = prop.get("type")
+    if isinstance(declared, list):
+        declared = next((t for t in declared if t != "null"), None)
+    if declared is None and "properties" in prop:
+        return "object"
+    return declared
+
+
+def layout(schema: dict, path: tuple = (), in_item: bool = False):
+    """
+    Split a schema into scalar columns and child tables.
+    Returns (columns, tables): columns maps a column name to (path, property
+    schema); tables maps a table name to (path, item schema) for every array.
+    Nested objects become "parent__child" columns. Arrays inside array items
+    are kept as JSON strings rather than tables of tables.
+    """
+    columns, tables = {}, {}
+    for name, prop in schema.get("properties", {}).items():
+        prop_path = path + (name,)
+        column = "__".join(prop_path)
+        kind = _schema_type(prop)
+        if kind == "object" and prop.get("properties"):
+            sub_columns, sub_tables = layout(prop, prop_path, in_item)
+            columns.update(sub_columns)
+            tables.update(sub_tables)
+        elif kind == "array" and not in_item:
+            tables[column] = (prop_path, prop.get("items", {}))
+        else:
+            columns[column] = (prop_path, prop)
+    return columns, tables
+
+
+def _get(record, path):
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def unwrap(record):
+    """Landing AI responses wrap the fields in "extraction"; OpenAI ones don't."""
+    if isinstance(record, dict) and isinstance(record.get("extraction"), dict):
+        return record["extraction"]
+    return record if isinstance(record, dict) else {}
+
+
+# ------------------------------------------------------------------
+# TYPING
+# ------------------------------------------------------------------
+def coerce(series: pd.Series, prop: dict) -> pd.Series:
+    """Cast a column to the nullable dtype its schema type calls for."""
+    series = series.map(lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v)
+    kind = _schema_type(prop)
+    if kind in ("integer", "number"):
+        numbers = pd.to_numeric(series, errors="coerce").astype("Float64")
+        whole = numbers.dropna()
+        return numbers.astype("Int64") if kind == "integer" and (whole == whole.round()).all() else numbers
+    if kind == "boolean":
+        return series.map(
+            lambda v: v if isinstance(v, bool) else {"true": True, "yes": True, "false": False, "no": False}.get(str(v).strip().lower())
+        ).astype("boolean")
+    if prop.get("format") in ("date", "date-time"):
+        # ISO dates (what the models are asked for) first; dayfirst would read 2024-03-05 as 3 May
+        parsed = pd.to_datetime(series, errors="coerce", format="ISO8601")
+        unparsed = parsed.isna() & series.notna()
+        if unparsed.any():
+            parsed[unparsed] = pd.to_datetime(series[unparsed], errors="coerce", dayfirst=True, format="mixed")
+        return parsed
+    return series.astype("string")
+
+
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Numeric copies of result values and low/high bounds of reference ranges."""
+    for column in list(df.columns):
+        if df[column].dtype != "string":
+            continue
+        if VALUE_COLUMN_RE.search(column):
+            df[f"{column}_numeric"] = pd.to_numeric(df[column].str.extract(_NUMBER_RE, expand=False), errors="coerce").astype("Float64")
+        elif RANGE_COLUMN_RE.search(column):
+            bounds = df[column].str.extract(_RANGE_RE)
+            df[f"{column}_low"] = pd.to_numeric(bounds[0], errors="coerce").astype("Float64")
+            df[f"{column}_high"] = pd.to_numeric(bounds[1], errors="coerce").astype("Float64")
+    return df
+
+
+# ------------------------------------------------------------------
+# FLATTENING
+# ------------------------------------------------------------------
+def build_tables(records: pd.DataFrame, schema: dict) -> dict:
+    """
+    records has record_id, optional source_file and original_path, and a parsed "record" column.
+    Returns {"documents": one row per record, <array name>: one row per item}.
+    """
+    columns, tables = layout(root_schema(schema))
+    keys = records[[c for c in ("record_id", "source_file", "original_path") if c in records.columns]].reset_index(drop=True)
+    parsed = records["record"].tolist()
+
+    documents = keys.copy()
+    for column, (path, prop) in columns.items():
+        documents[column] = coerce(pd.Series([_get(r, path) for r in parsed], dtype=object), prop)
+    result = {"documents": add_derived_columns(documents)}
+
+    for table, (path, item_schema) in tables.items():
+        item_columns, _ = layout(item_schema, in_item=True) if _schema_type(item_schema) == "object" else ({}, {})
+        rows, owners = [], []
+        for i, record in enumerate(parsed):
+            items = _get(record, path)
+            for position, item in enumerate(items if isinstance(items, list) else []):
+                rows.append(item)
+                owners.append((i, position))
+
+        child = keys.iloc[[i for i, _ in owners]].reset_index(drop=True)
+        child["position"] = pd.Series([p for _, p in owners], dtype="Int64")
+        if item_columns:
+            for column, (item_path, prop) in item_columns.items():
+                child[column] = coerce(pd.Series([_get(r, item_path) for r in rows], dtype=object), prop)
+        else:
+            child["value"] = coerce(pd.Series(rows, dtype=object), item_schema)
+        result[table] = add_derived_columns(child)
+
+    return result
+
+
+def load_records(csv_files, json_column: str) -> pd.DataFrame:
+    """Read result CSVs and parse the JSON column once."""
+    frames = []
+    for csv_file in csv_files:
+        df = pd.read_csv(csv_file, dtype="string")
+        if json_column not in df.columns:
+            print(f"[SKIPPED] {csv_file.name}: no {json_column} column")
+            continue
+        df["record_id"] = csv_file.stem + ":" + pd.Series(range(len(df)), dtype="string")
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["record_id", "record"])
+
+    records = pd.concat(frames, ignore_index=True)
+    parsed, bad = [], 0
+    for raw in records[json_column].fillna(""):
+        try:
+            parsed.append(unwrap(json.loads(raw)))
+        except json.JSONDecodeError:
+            parsed.append({})
+            bad += 1
+    if bad:
+        print(f"  {bad} rows with unparseable JSON kept with empty fields")
+    records["record"] = parsed
+    return records
+
+
+# ------------------------------------------------------------------
+# MAIN SCRIPT
+# ------------------------------------------------------------------
+def main():
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    for source in SOURCES:
+        csv_files = sorted(results_folder.glob(source["csv_glob"]))
+        if not csv_files:
+            print(f"[SKIPPED] {source['name']}: no files match {source['csv_glob']}")
+            continue
+        if not source["schema"].exists():
+            print(f"[SKIPPED] {source['name']}: schema {source['schema']} not found")
+            continue
+
+        with open(source["schema"], "r", encoding="utf-8") as f:
+            schema = json.load(f)
+
+        print(f"{source['name']}: flattening {len(csv_files)} CSV files")
+        records = load_records(csv_files, source["json_column"])
+        for table, df in build_tables(records, schema).items():
+            output_file = output_folder / f"{source['name']}_{table}.parquet"
+            df.to_parquet(output_file, index=False)
+            print(f"  [DONE] {table}: {len(df)} rows, {len(df.columns)} columns → {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import argparse
+import difflib
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+# ---- Defaults ----
+# One index per document kind, the files extract_json_props_from_html.py / _text.py load
+index_files = {
+    "html": Path("near_duplicate_index_html.json"),
+    "text": Path("near_duplicate_index_text.json"),
+}
+documents_folders = {
+    "html": Path(os.getenv("HTML_FOLDER", "/opt/softwares/automations_and_data_pipelines/data/html_outputs")),
+    "text": Path(os.getenv("TEXT_FOLDER", "/opt/softwares/automations_and_data_pipelines/data/text_outputs/")),
+}
+extensions = {"html": "*.html", "text": "*.txt"}
+
+# Documents at or above this estimated Jaccard similarity are put in the same cluster
+cluster_threshold = 0.8
+# Documents at or above this estimated similarity are candidates for reusing a
+# result; the MinHash estimate is only a filter, reusable_diff() on the actual
+# words decides (the same template with another patient is ~0.98 similar too)
+reuse_threshold = 0.9
+# Reuse only tolerates a handful of changed words, none of them identifying or a value
+max_reuse_diff_words = 5
+# Words around a change that mark it as part of an identifying field
+reuse_context_words = 3
+IDENTIFYING_WORDS = {
+    "name", "patient", "surname", "mr", "mrs", "ms", "miss", "dr", "age", "years", "yrs", "sex",
+    "gender", "male", "female", "dob", "birth", "born", "date", "collected", "received", "reported",
+    "id", "no", "number", "ref", "lab", "ward", "bed", "hospital", "requested", "by", "doctor",
+}
+RESULT_WORDS = {
+    "positive", "negative", "reactive", "nonreactive", "non", "detected", "not", "present",
+    "absent", "normal", "abnormal", "high", "low", "trace", "nil", "seen", "pos", "neg",
+}
+
+_PRIME = (1 << 31) - 1  # keeps a * x + b inside uint64 for 31-bit hashes
+_TAG_RE = re.compile(r"<[^<>]+>")
+# Words, and runs of sign/comparison characters as tokens of their own (O+ vs O-, + vs +++, <0.5 vs >0.5)
+_WORD_RE = re.compile(r"\w+|[+\-<>]+")
+_SIGNS = set("+-<>")
+
+
+def normalize(text: str) -> list:
+    """Strip HTML tags (and with them any inline base64 images) and return lowercase words and sign tokens."""
+    return _WORD_RE.findall(html.unescape(_TAG_RE.sub(" ", text)).lower())
+
+
+def reusable_diff(words_a: list, words_b: list) -> bool:
+    """
+    True if two normalized documents differ only in a few words that are not
+    identifying (name, age, sex, dates, ids), not values (digits, signs and
+    comparisons, qualitative results, short codes like blood groups) and not
+    next to such a label.
+    """
+    matcher = difflib.SequenceMatcher(None, words_a, words_b, autojunk=False)
+    changed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        tokens = words_a[i1:i2] + words_b[j1:j2]
+        changed += len(tokens)
+        if changed > max_reuse_diff_words:
+            return False
+        for token in tokens:
+            if any(c.isdigit() or c in _SIGNS for c in token) or len(token) <= 2 \
+                    or token in IDENTIFYING_WORDS or token in RESULT_WORDS:
+                return False
+        context = words_a[max(0, i1 - reuse_context_words):i1] + words_a[i2:i2 + reuse_context_words]
+        if any(word in IDENTIFYING_WORDS for word in context):
+            return False
+    return True
+
+
+def shingles(words: list, size: int) -> np.ndarray:
+    """31-bit hashes of the word n-grams of a document."""
+    if len(words) < size:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") & _PRIME
+        for g in grams
+    ]
+    return np.array(hashes, dtype=np.uint64)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures bucketed with LSH banding. Adding a document and
+    querying for its neighbours only touches the buckets it falls in, so
+    both stay fast as the corpus grows. Extraction results can be stored
+    against a document (with its normalized words) and looked up for
+    near-identical ones; a result is only handed out after reusable_diff()
+    confirmed the two texts differ in nothing that matters. Documents still
+    being extracted are tracked too (begin/finish), so concurrent workers
+    can wait for a near-identical result rather than all miss the index.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+
+        self.signatures = {}  # key -> np.ndarray
+        self.results = {}     # key -> extraction result
+        self.words = {}       # key -> normalized words, for documents with a result
+        self.in_flight = {}   # key -> (normalized words, threading.Event), for documents being extracted
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+
+    # ---------------- signatures ----------------
+    def signature(self, text: str):
+        """MinHash signature of a document, or None if it has no words."""
+        hashes = shingles(normalize(text), self.shingle_size)
+        if hashes.size == 0:
+            return None
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, rows.tobytes()
+
+    @staticmethod
+    def similarity(sig_a, sig_b) -> float:
+        """Estimated Jaccard similarity of two documents."""
+        return float(np.mean(sig_a == sig_b))
+
+    # ---------------- index ----------------
+    def add(self, key: str, signature, result=None, text: str = None):
+        """Index a document; a result is only stored (and reusable) together with the text it came from."""
+        if key in self.signatures:
+            self.remove(key)
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].add(key)
+        if result is not None and text is not None:
+            self.results[key] = result
+            self.words[key] = normalize(text)
+
+    def remove(self, key: str):
+        signature = self.signatures.pop(key, None)
+        self.results.pop(key, None)
+        self.words.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band].get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(self, signature, min_similarity: float = cluster_threshold) -> list:
+        """[(key, similarity)] of indexed documents at or above min_similarity, best first."""
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        matches = [(key, self.similarity(signature, self.signatures[key])) for key in candidates]
+        matches = [m for m in matches if m[1] >= min_similarity]
+        return sorted(matches, key=lambda m: m[1], reverse=True)
+
+    def cached_result(self, signature, text: str, min_similarity: float = reuse_threshold):
+        """
+        (key, similarity, result) of the closest document with a stored result
+        whose words differ from text only in ways reusable_diff() allows, or None.
+        """
+        words = None
+        for key, similarity in self.query(signature, min_similarity):
+            if key not in self.results:
+                continue
+            words = normalize(text) if words is None else words
+            if reusable_diff(self.words[key], words):
+                return key, similarity, self.results[key]
+        return None
+
+    # ---------------- in-flight documents ----------------
+    def begin(self, key: str, signature, text: str):
+        """Mark a document as being extracted, so near-identical ones can wait for its result instead of extracting too."""
+        self.add(key, signature)
+        self.in_flight[key] = (normalize(text), threading.Event())
+
+    def in_flight_match(self, signature, text: str, min_similarity: float = reuse_threshold):
+        """Event set when an in-flight document whose result will be reusable for text finishes, or None."""
+        words = None
+        for key, _ in self.query(signature, min_similarity):
+            if key not in self.in_flight:
+                continue
+            words = normalize(text) if words is None else words
+            if reusable_diff(self.in_flight[key][0], words):
+                return self.in_flight[key][1]
+        return None
+
+    def finish(self, key: str, signature, result=None, text: str = None):
+        """Store a document's result (if it has one) and wake the documents waiting on it."""
+        _, done = self.in_flight.pop(key, (None, None))
+        if signature is not None and result is not None:
+            self.add(key, signature, result, text)
+        if done is not None:
+            done.set()
+
+    def clusters(self, min_similarity: float = cluster_threshold) -> list:
+        """Group indexed documents into clusters of near-identical ones (union-find over LSH matches)."""
+        parent = {key: key for key in self.signatures}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, signature in self.signatures.items():
+            for other, _ in self.query(signature, min_similarity):
+                root_a, root_b = find(key), find(other)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+        groups = defaultdict(list)
+        for key in self.signatures:
+            groups[find(key)].append(key)
+        return sorted(groups.values(), key=len, reverse=True)
+
+    # ---------------- persistence ----------------
+    def snapshot(self) -> dict:
+        """
+        Shallow copies of the index state, cheap enough to take under the
+        extractors' lock; save() serialises one afterwards without it. The
+        stored signatures, results and words are never mutated in place.
+        """
+        return {"signatures": dict(self.signatures), "results": dict(self.results), "words": dict(self.words)}
+
+    def save(self, path: Path, snapshot: dict = None):
+        snapshot = snapshot or self.snapshot()
+        data = {
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "shingle_size": self.shingle_size,
+            "seed": self.seed,
+            "signatures": {key: sig.tolist() for key, sig in snapshot["signatures"].items()},
+            "results": snapshot["results"],
+            "words": {key: " ".join(words) for key, words in snapshot["words"].items()},
+        }
+        tmp_path = Path(path).with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, **kwargs):
+        """Load an index from disk, or create an empty one with kwargs if it doesn't exist."""
+        if not Path(path).exists():
+            return cls(**kwargs)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(
+            num_perm=data["num_perm"],
+            bands=data["bands"],
+            shingle_size=data["shingle_size"],
+            seed=data["seed"],
+        )
+        # Results saved without their words (older index files) can't be verified, so they are dropped
+        results = data.get("results", {})
+        words = data.get("words", {})
+        for key, sig in data["signatures"].items():
+            index.add(key, np.array(sig, dtype=np.uint64), results.get(key), words.get(key))
+        return index
+
+
+# ------------------------------------------------------------------
+# MAIN SCRIPT: index a folder and report clusters
+# ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add a folder of documents to the extractors' near-duplicate index.")
+    parser.add_argument("kind", choices=sorted(index_files), help="document kind; each kind has its own index")
+    parser.add_argument("--folder", type=Path, help="documents to index (default: the extractor's input folder)")
+    parser.add_argument("--index", type=Path, help="index file (default: the one the extractor of this kind loads)")
+    args = parser.parse_args(argv)
+    folder = args.folder or documents_folders[args.kind]
+    index_file = args.index or index_files[args.kind]
+
+    index = NearDuplicateIndex.load(index_file)
+    files = sorted(folder.glob(extensions[args.kind]))
+    print(f"Indexing {len(files)} documents ({len(index.signatures)} already indexed)...")
+
+    for file in files:
+        text = file.read_text(encoding="utf-8", errors="ignore")
+        signature = index.signature(text)
+        if signature is None:
+            continue
+        # A stored result stays only if it was extracted from this same text
+        words = index.words.get(file.name)
+        unchanged = words is not None and words == normalize(text)
+        index.add(file.name, signature, index.results.get(file.name) if unchanged else None, text if unchanged else None)
+
+    index.save(index_file)
+
+    clusters = [c for c in index.clusters() if len(c) > 1]
+    clustered = sum(len(c) for c in clusters)
+    print(f"{len(index.signatures)} documents, {len(clusters)} clusters of near-identical documents")
+    print(f"{clustered - len(clusters)} documents could reuse a cluster result")
+    for cluster in clusters[:10]:
+        print(f"  {len(cluster)} × {cluster[0]}")
+    print(f"Index saved to {index_file}")
+
+
+if __name__ == "__main__":
+    main()
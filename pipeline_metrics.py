@@ -0,0 +1,232 @@
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+# Where metrics files go and how often they are rewritten
+metrics_dir = Path(os.getenv("PIPELINE_METRICS_DIR", "metrics"))
+export_interval = float(os.getenv("PIPELINE_METRICS_INTERVAL", "15"))
+# Comma-separated profile() sections to run under cProfile, e.g. PIPELINE_PROFILE=extract_file
+profiled_sections = {s.strip() for s in os.getenv("PIPELINE_PROFILE", "").split(",") if s.strip()}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Recent samples kept per stage for percentiles in the JSON export
+_RESERVOIR = 2048
+
+
+def _metric_name(name: str) -> str:
+    """Counter names may contain model names like gpt-4.1-nano; Prometheus allows [a-zA-Z0-9_]."""
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class _StageMetrics:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.recent = deque(maxlen=_RESERVOIR)
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+        self.latency_count += 1
+        self.recent.append(seconds)
+
+
+class Metrics:
+    """
+    Per-stage counters (items, errors, retries, bytes_in/out, tokens...),
+    gauges (queue depth...) and latency histograms for one pipeline run.
+    Thread-safe. Once started, a daemon thread rewrites
+    <metrics_dir>/<pipeline>.json and <pipeline>.prom (Prometheus textfile
+    format) every export_interval seconds and once more at exit.
+    """
+
+    def __init__(self, pipeline: str = "pipeline"):
+        self.pipeline = pipeline
+        self.started = time.time()
+        self._stages = defaultdict(_StageMetrics)
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._exporter = None
+        self._stop = threading.Event()
+
+    # ---------------- recording ----------------
+    def increment(self, stage: str, name: str, value: float = 1):
+        with self._lock:
+            self._stages[stage].counters[name] += value
+
+    def set_gauge(self, stage: str, name: str, value: float):
+        with self._lock:
+            self._stages[stage].gauges[name] = value
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self._stages[stage].observe(seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Time a block as one item of a stage; an exception counts as an error and propagates."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(stage, "errors")
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+            self.increment(stage, "items")
+
+    @contextmanager
+    def profile(self, section: str):
+        """Run the block under cProfile if the section is listed in PIPELINE_PROFILE."""
+        if section not in profiled_sections:
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread is already profiling (one profiler at a time on newer Pythons)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                if section in self._profiles:
+                    self._profiles[section].add(profiler)
+                else:
+                    self._profiles[section] = pstats.Stats(profiler)
+
+    # ---------------- export ----------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {}
+            for name, stage in self._stages.items():
+                recent = sorted(stage.recent)
+                percentiles = {
+                    f"p{q}": round(recent[min(len(recent) - 1, int(q / 100 * len(recent)))], 4) if recent else None
+                    for q in (50, 90, 99)
+                }
+                stages[name] = {
+                    "counters": dict(stage.counters),
+                    "gauges": dict(stage.gauges),
+                    "latency_seconds": {
+                        "count": stage.latency_count,
+                        "sum": round(stage.latency_sum, 4),
+                        **percentiles,
+                    },
+                }
+        return {
+            "pipeline": self.pipeline,
+            "updated": time.time(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "stages": stages,
+        }
+
+    def prometheus(self) -> str:
+        labels = 'pipeline="{}",stage="{}"'
+        counters, gauges, histograms = defaultdict(list), defaultdict(list), []
+        with self._lock:
+            for name, stage in self._stages.items():
+                label = labels.format(self.pipeline, name)
+                for counter, value in stage.counters.items():
+                    counter = _metric_name(counter)
+                    counters[counter].append(f"pipeline_{counter}_total{{{label}}} {value:g}")
+                for gauge, value in stage.gauges.items():
+                    gauge = _metric_name(gauge)
+                    gauges[gauge].append(f"pipeline_{gauge}{{{label}}} {value:g}")
+                if stage.latency_count:
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stage.bucket_counts):
+                        cumulative += count
+                        histograms.append(f'pipeline_latency_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                    histograms.append(f"pipeline_latency_seconds_sum{{{label}}} {stage.latency_sum:.6f}")
+                    histograms.append(f"pipeline_latency_seconds_count{{{label}}} {stage.latency_count}")
+
+        lines = []
+        for counter, samples in counters.items():
+            lines += [f"# TYPE pipeline_{counter}_total counter"] + samples
+        for gauge, samples in gauges.items():
+            lines += [f"# TYPE pipeline_{gauge} gauge"] + samples
+        if histograms:
+            lines += ["# TYPE pipeline_latency_seconds histogram"] + histograms
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Atomically rewrite the JSON and Prometheus files (and any collected profiles)."""
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        for suffix, content in ((".json", json.dumps(self.snapshot(), indent=2)), (".prom", self.prometheus())):
+            path = metrics_dir / f"{self.pipeline}{suffix}"
+            tmp_path = path.with_suffix(suffix + ".tmp")
+            tmp_path.write_text(content, encoding="utf-8")
+            os.replace(tmp_path, path)
+        with self._lock:
+            for section, stats in self._profiles.items():
+                stats.dump_stats(metrics_dir / f"{self.pipeline}_{section}.pstats")
+
+    def start_exporter(self):
+        if self._exporter is not None:
+            return
+
+        def run():
+            while not self._stop.wait(export_interval):
+                try:
+                    self.export()
+                except OSError:
+                    pass
+
+        self._exporter = threading.Thread(target=run, name=f"metrics-{self.pipeline}", daemon=True)
+        self._exporter.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self.export()
+
+
+_metrics = Metrics()
+
+
+def start(pipeline: str) -> Metrics:
+    """Name this run's metrics and start the periodic export. Call once per script."""
+    _metrics.pipeline = pipeline
+    _metrics.start_exporter()
+    return _metrics
+
+
+def get() -> Metrics:
+    return _metrics
+
+
+# Module-level shortcuts, so callers don't need to pass a Metrics around
+def increment(stage: str, name: str, value: float = 1):
+    _metrics.increment(stage, name, value)
+
+
+def set_gauge(stage: str, name: str, value: float):
+    _metrics.set_gauge(stage, name, value)
+
+
+def observe(stage: str, seconds: float):
+    _metrics.observe(stage, seconds)
+
+
+def timed(stage: str):
+    return _metrics.timed(stage)
+
+
+def profile(section: str):
+    return _metrics.profile(section)
@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+
+# Starting quota per model; replaced by x-ratelimit-limit-* as soon as a response arrives
+default_requests_per_minute = 500
+default_tokens_per_minute = 200000
+# Fraction of the quota to use, leaving room for estimation error
+headroom = 0.9
+
+# Rough chars-per-token ratio and the completion budget reserved per request
+chars_per_token = 4
+expected_output_tokens = 1000
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Tokens a request counts against the TPM limit: the prompt plus the completion budget."""
+    return len(prompt) // chars_per_token + expected_output_tokens
+
+
+def parse_duration(value) -> float:
+    """Parse OpenAI reset headers such as "20ms", "1s" or "6m0s" into seconds."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    """
+    Paces requests to stay just under a requests-per-minute and
+    tokens-per-minute quota. Two buckets refill continuously; acquire()
+    blocks until both have room for the next request. The buckets are
+    corrected from the x-ratelimit-* response headers, and a 429 pauses
+    every caller until the reported reset instead of each one backing off
+    on its own. Thread-safe.
+    """
+
+    def __init__(self, requests_per_minute: int = default_requests_per_minute,
+                 tokens_per_minute: int = default_tokens_per_minute, headroom: float = headroom):
+        self.headroom = headroom
+        self.requests_per_minute = requests_per_minute * headroom
+        self.tokens_per_minute = tokens_per_minute * headroom
+        self._requests = self.requests_per_minute
+        self._tokens = self.tokens_per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self.stats = {"requests": 0, "tokens": 0, "waited_seconds": 0.0, "rate_limited": 0}
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._updated = now
+
+    def acquire(self, tokens: int):
+        """Block until a request of `tokens` fits in the budget, then debit it."""
+        # A single request larger than the whole budget must still go out eventually
+        tokens = min(tokens, self.tokens_per_minute)
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    missing_requests = 1 - self._requests
+                    missing_tokens = tokens - self._tokens
+                    if missing_requests <= 0 and missing_tokens <= 0:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        self.stats["requests"] += 1
+                        self.stats["tokens"] += tokens
+                        self.stats["waited_seconds"] += now - started
+                        return
+                    wait = max(
+                        missing_requests * 60 / self.requests_per_minute,
+                        missing_tokens * 60 / self.tokens_per_minute,
+                    )
+                self._cond.wait(wait)
+
+    def update_from_headers(self, headers):
+        """Adopt the server's view of the quota and of what is left of it."""
+        limit_requests = _header_int(headers, "x-ratelimit-limit-requests")
+        limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+
+        with self._cond:
+            self._refill(time.monotonic())
+            if limit_requests:
+                self.requests_per_minute = limit_requests * self.headroom
+            if limit_tokens:
+                self.tokens_per_minute = limit_tokens * self.headroom
+            # Keep the reserve (1 - headroom) of the real quota untouched
+            if remaining_requests is not None:
+                reserve = (limit_requests or 0) * (1 - self.headroom)
+                self._requests = min(self._requests, remaining_requests - reserve)
+            if remaining_tokens is not None:
+                reserve = (limit_tokens or 0) * (1 - self.headroom)
+                self._tokens = min(self._tokens, remaining_tokens - reserve)
+            self._cond.notify_all()
+
+    def rate_limited(self, headers, fallback_delay: float) -> float:
+        """Pause all dispatch after a 429 until the reported reset. Returns the pause in seconds."""
+        delay = max(
+            parse_duration(headers.get("retry-after")) or 0,
+            parse_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+            parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0,
+        ) or fallback_delay
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.stats["rate_limited"] += 1
+        return delay
+
+    def summary(self) -> str:
+        return (
+            f"{self.stats['requests']} requests, ~{self.stats['tokens']} tokens scheduled; "
+            f"waited {self.stats['waited_seconds']:.1f}s for budget, {self.stats['rate_limited']} rate-limit responses"
+        )
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler_for(model: str) -> RateLimitScheduler:
+    """One scheduler per model, since OpenAI quotas are per model."""
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = RateLimitScheduler()
+        return _schedulers[model]
+
+
+def all_schedulers() -> dict:
+    return dict(_schedulers)
@@ -0,0 +1,338 @@
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+
+from chunked_extraction import root_schema
+
+# Models used for documents the rules could not complete
+default_model = "gpt-4o-mini"
+small_model = "gpt-4.1-nano"
+# Documents up to this many characters go to the small model
+small_model_max_chars = 4000
+
+# Rough chars-per-token ratio used to estimate tokens spared
+chars_per_token = 4
+
+
+# ------------------------------------------------------------------
+# RULES
+# ------------------------------------------------------------------
+# rule name → (schema property names it may fill, pattern whose group 1 is the value)
+SCALAR_RULES = {
+    "patient_name": (
+        ("patient_name", "name", "patient", "full_name", "patient_full_name"),
+        re.compile(
+            r"(?im)^[ \t]*(?:patient(?:'s)?[ \t]*name|name[ \t]*of[ \t]*patient|patient|name)[ \t]*[:\-][ \t]*"
+            r"([A-Za-z][A-Za-z .'\-]{1,60}?)[ \t]*(?:$|[ \t]{2,}|\b(?:age|sex|gender|date|dob)\b)"
+        ),
+    ),
+    "age": (
+        ("age", "patient_age"),
+        re.compile(r"(?i)\bage[ \t]*[:\-]?[ \t]*(\d{1,3})[ \t]*(?:y(?:ea)?rs?|yrs?|y)?\b"),
+    ),
+    "sex": (
+        ("sex", "gender", "patient_sex", "patient_gender"),
+        re.compile(r"(?i)\b(?:sex|gender)[ \t]*[:\-]?[ \t]*(male|female|m|f)\b"),
+    ),
+    "date": (
+        ("date", "report_date", "test_date", "collection_date", "sample_date", "date_collected", "date_reported"),
+        re.compile(
+            r"(?i)\bdate(?:[ \t]+of[ \t]+\w+)?[ \t]*[:\-]?[ \t]*"
+            r"(\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}[ \t]+[A-Za-z]{3,9},?[ \t]+\d{4})"
+        ),
+    ),
+}
+
+# Day-first formats, as used on our reports
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d-%m-%y", "%d.%m.%Y", "%Y-%m-%d", "%d %b %Y", "%d %B %Y", "%d %b, %Y", "%d %B, %Y")
+
+# Array properties holding one item per test, and the item fields each table column fills
+TEST_ARRAY_NAMES = ("tests", "test_results", "results", "lab_tests", "lab_results", "investigations")
+TEST_COLUMNS = {
+    "name": (("test_name", "test", "name", "parameter", "investigation", "analyte"), re.compile(r"(?i)test|parameter|investigation|analyte|examination")),
+    "value": (("result", "value", "result_value", "test_result"), re.compile(r"(?i)result|value")),
+    "unit": (("unit", "units"), re.compile(r"(?i)\bunits?\b")),
+    "range": (("reference_range", "normal_range", "range", "reference", "ref_range"), re.compile(r"(?i)range|reference|normal")),
+}
+
+# A row of a plain-text results table: name, value (a number, a qualitative
+# result or a blood group), optional unit and range
+_TEXT_ROW_RE = re.compile(
+    r"(?i)^[ \t]*([A-Za-z][A-Za-z0-9 ()/%.,\-]{1,40}?)[ \t]{2,}"
+    r"([<>]?\d+(?:\.\d+)?|non[ \t-]?reactive|reactive|positive|negative|not[ \t]+detected|detected|"
+    r"nil|normal|abnormal|trace|present|absent|not[ \t]+seen|seen|(?:AB|A|B|O)[ \t]*(?:rh[ \t]*)?(?:\+|-|pos|neg)\w*)"
+    r"(?:[ \t]+([A-Za-z/%µ^*][A-Za-z0-9/%µ^*.]{0,14}))?"
+    r"(?:[ \t]+(\d+(?:\.\d+)?[ \t]*[-–][ \t]*\d+(?:\.\d+)?))?[ \t]*$"
+)
+# A line laid out in columns, i.e. one that could be a table row
+_COLUMNS_RE = re.compile(r"\S[ \t]{2,}\S")
+# Lines starting with a patient detail label belong to the header block, not to a results table
+_LABEL_RE = re.compile(r"(?i)^[ \t]*(?:patient|name|age|sex|gender|date|dob)\b")
+# A "label: value" line, e.g. "Serology / HIV: Reactive"
+_VALUE_LINE_RE = re.compile(r"^[ \t]*[A-Za-z][^:\n]{0,60}:[ \t]*\S")
+# Labels of sign-off lines, which carry no results ("Verified by: ...", "Signature: ...")
+_SIGNOFF_RE = re.compile(r"(?i)\b(?:by|signature|signed|page)\b")
+_HTML_BLOCK_TAGS = ("p", "br", "div", "li", "h1", "h2", "h3", "h4", "h5", "h6")
+_BLOCK_TAG_RE = re.compile(r"(?i)</(?:p|tr|h[1-6]|li|div)>|<br\s*/?>")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class _TableParser(HTMLParser):
+    """
+    Collects every <table> as a list of rows of cell text, and the text
+    outside tables as (tables seen so far, text) pairs with block ends as
+    newlines, so what follows a given table can be checked too.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tables, self._row, self._cell = [], None, None
+        self.outside, self._depth = [], 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _HTML_BLOCK_TAGS and self._depth == 0:
+            self.outside.append((len(self.tables), "\n"))
+        if tag == "table":
+            self.tables.append([])
+            self._depth += 1
+        elif tag == "tr" and self.tables:
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self._depth = max(0, self._depth - 1)
+        elif tag in _HTML_BLOCK_TAGS and self._depth == 0:
+            self.outside.append((len(self.tables), "\n"))
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self.tables[-1].append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        elif self._depth == 0:
+            self.outside.append((len(self.tables), data))
+
+
+def html_to_text(html: str) -> str:
+    return _TAG_RE.sub(" ", _BLOCK_TAG_RE.sub("\n", html))
+
+
+# ------------------------------------------------------------------
+# SCALAR FIELDS
+# ------------------------------------------------------------------
+def _normalize(rule: str, raw: str):
+    """Normalized value, or None if it can't be trusted."""
+    raw = " ".join(raw.split())
+    if rule == "sex":
+        return {"m": "Male", "f": "Female"}.get(raw.lower(), raw.capitalize())
+    if rule == "age":
+        return int(raw) if int(raw) < 130 else None
+    if rule == "date":
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(raw, fmt).date().isoformat()
+            except ValueError:
+                continue
+        return None
+    return raw.title() if raw.isupper() or raw.islower() else raw
+
+
+def extract_scalars(text: str, properties: dict) -> dict:
+    """Fill schema properties whose rule matched with one unambiguous value."""
+    record = {}
+    for rule, (aliases, pattern) in SCALAR_RULES.items():
+        targets = [name for name in properties if name.lower() in aliases]
+        # e.g. two date properties: the rule can't tell which one a date belongs to
+        if len(targets) != 1:
+            continue
+        values = {_normalize(rule, m.group(1)) for m in pattern.finditer(text)}
+        if len(values) == 1 and None not in values:
+            record[targets[0]] = values.pop()
+    return record
+
+
+# ------------------------------------------------------------------
+# TEST TABLES
+# ------------------------------------------------------------------
+def _item_fields(item_schema: dict) -> dict:
+    """Map column role → item property name, for roles the item schema has."""
+    names = item_schema.get("properties", {})
+    fields = {}
+    for role, (aliases, _) in TEST_COLUMNS.items():
+        match = next((name for name in names if name.lower() in aliases), None)
+        if match:
+            fields[role] = match
+    return fields
+
+
+def _rows_to_items(header, rows, fields):
+    """
+    (items, complete) for the rows under a header row, or None if the header
+    has no test name and result columns. complete is False if a non-empty
+    row lacked either, so the document isn't trusted to the rules alone.
+    """
+    columns = {}
+    for role, (_, pattern) in TEST_COLUMNS.items():
+        for i, cell in enumerate(header):
+            if pattern.search(cell) and i not in columns.values() and role not in columns:
+                columns[role] = i
+    if "name" not in columns or "value" not in columns:
+        return None
+
+    items, complete = [], True
+    for row in rows:
+        cells = {role: row[i].strip() if i < len(row) else "" for role, i in columns.items()}
+        if not cells["name"] or not cells["value"]:
+            complete = complete and not any(cell.strip() for cell in row)
+            continue
+        items.append({fields[role]: value for role, value in cells.items() if role in fields})
+    return items, complete
+
+
+def _unconsumed_value(line: str) -> bool:
+    """True for a line after the results that looks like a result the rules didn't take ("HIV: Reactive")."""
+    if not line.strip() or _LABEL_RE.match(line):
+        return False
+    if not (_VALUE_LINE_RE.match(line) or _COLUMNS_RE.search(line)):
+        return False
+    label = re.split(r":|[ \t]{2,}", line.strip(), maxsplit=1)[0]
+    return not _SIGNOFF_RE.search(label)
+
+
+def extract_html_tests(html: str, fields: dict):
+    """
+    (items, complete) from every results table of a document. complete is
+    False if a results table had rows the rules skipped, if another table
+    with two or more non-empty rows has no header they recognise (other
+    than a block of patient details), or if a value-like line follows the
+    first results table.
+    """
+    parser = _TableParser()
+    parser.feed(html)
+    items, complete, first_results = [], True, None
+    for index, table in enumerate(parser.tables):
+        for i, row in enumerate(table):
+            found = _rows_to_items(row, table[i + 1:], fields)
+            if found:
+                items.extend(found[0])
+                complete = complete and found[1]
+                first_results = index if first_results is None else first_results
+                break
+        else:
+            rows = [row for row in table if any(cell.strip() for cell in row)]
+            if len(rows) >= 2 and not all(row and _LABEL_RE.match(row[0]) for row in rows):
+                complete = False
+
+    if first_results is not None:
+        after = "".join(text for tables_seen, text in parser.outside if tables_seen > first_results)
+        complete = complete and not any(_unconsumed_value(line) for line in after.splitlines())
+    return items, complete
+
+
+def extract_text_tests(text: str, fields: dict):
+    """
+    (items, complete) from every results table of a plain-text document.
+    A table runs from its header line to the first line that isn't a row.
+    complete is False if that line directly followed a row (a row the rules
+    would drop), or if any line after the first table looks like a value
+    they didn't take: a "label: value" line or one laid out in columns.
+    """
+    items, complete, in_table, seen_table, after_blank = [], True, False, False, False
+    for line in text.splitlines():
+        if not line.strip():
+            after_blank = True
+            continue
+        if TEST_COLUMNS["name"][1].search(line) and TEST_COLUMNS["value"][1].search(line):
+            in_table = seen_table = True
+            after_blank = False
+            continue
+        match = _TEXT_ROW_RE.match(line) if in_table else None
+        if match and not _LABEL_RE.match(line):
+            after_blank = False
+            cells = dict(zip(("name", "value", "unit", "range"), match.groups()))
+            items.append({fields[role]: value.strip() for role, value in cells.items() if value and role in fields})
+            continue
+        if in_table and not after_blank and not _LABEL_RE.match(line):
+            complete = False
+        if seen_table and _unconsumed_value(line):
+            complete = False
+        in_table = after_blank = False
+    return items, complete
+
+
+# ------------------------------------------------------------------
+# PRE-EXTRACTION AND ROUTING
+# ------------------------------------------------------------------
+def pre_extract(document: str, schema: dict, kind: str = "text"):
+    """
+    Fill what the rules can, deterministically.
+    Returns (record, complete) where complete means every required schema
+    property (every property if none are marked required) was filled, every
+    row of the results tables was parsed and no other table or value-like
+    line was left over.
+    """
+    schema = root_schema(schema)
+    properties = schema.get("properties", {})
+    text = html_to_text(document) if kind == "html" else document
+
+    record = extract_scalars(text, properties)
+    tables_complete = True
+
+    for name, prop in properties.items():
+        if name.lower() not in TEST_ARRAY_NAMES or prop.get("type") != "array":
+            continue
+        fields = _item_fields(prop.get("items", {}))
+        if "name" not in fields or "value" not in fields:
+            continue
+        items, parsed_all = extract_html_tests(document, fields) if kind == "html" else extract_text_tests(text, fields)
+        tables_complete = tables_complete and parsed_all
+        if items:
+            record[name] = items
+
+    required = schema.get("required") or list(properties)
+    complete = tables_complete and bool(required) and all(record.get(name) not in (None, "", []) for name in required)
+    return record, complete
+
+
+def choose_model(document: str) -> str:
+    return small_model if len(document) <= small_model_max_chars else default_model
+
+
+def fill_missing(record: dict, rule_record: dict) -> dict:
+    """Use rule values for fields the model left empty."""
+    for name, value in rule_record.items():
+        if record.get(name) in (None, "", []):
+            record[name] = value
+    return record
+
+
+def new_stats() -> dict:
+    return {"documents": 0, "rules_only": 0, "small_model": 0, "tokens_total": 0, "tokens_spared": 0}
+
+
+def record_routing(stats: dict, document: str, prompt_chars: int, complete: bool, model: str = None):
+    tokens = (len(document) + prompt_chars) // chars_per_token
+    stats["documents"] += 1
+    stats["tokens_total"] += tokens
+    if complete:
+        stats["rules_only"] += 1
+        stats["tokens_spared"] += tokens
+    elif model == small_model:
+        stats["small_model"] += 1
+
+
+def format_stats(stats: dict) -> str:
+    documents = stats["documents"] or 1
+    tokens = stats["tokens_total"] or 1
+    return (
+        f"Rules completed {stats['rules_only']}/{stats['documents']} documents "
+        f"({stats['rules_only'] / documents:.0%}), sparing ~{stats['tokens_spared']} of "
+        f"~{stats['tokens_total']} tokens ({stats['tokens_spared'] / tokens:.0%}); "
+        f"{stats['small_model']} routed to {small_model}"
+    )
@@ -1,31 +1,34 @@
+import argparse
+import csv
 import logging
 import sys
 import re
+import time
 import uuid
-import pandas as pd
 from urllib.parse import unquote
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+import pipeline_metrics
+
+# selenium is imported inside scrape_phone_numbers, so importing this module stays fast
 
 # ------------------------------------------------------------------
 # LOGGING CONFIGURATION
 # ------------------------------------------------------------------
 LOG_FILE = "google_maps_phone_scraper.log"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
-        logging.StreamHandler(sys.stdout),
-    ],
-)
-
 logger = logging.getLogger(__name__)
+
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(message)s",
+        handlers=[
+            logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
+            logging.StreamHandler(sys.stdout),
+        ],
+    )
+
 SCRAPPED_LINKS_PATH = "google_maps_places_10cdeaaa-6de2-4a27-881d-6e10e7d4b1c9.csv"
 # ------------------------------------------------------------------
 # HELPER FUNCTIONS
@@ -41,14 +44,20 @@ def extract_business_name(url: str) -> str:
     return ""
 
 # ------------------------------------------------------------------
-# MAIN SCRIPT
+# SCRAPING
 # ------------------------------------------------------------------
-def main(x):
+def scrape_phone_numbers(x):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+
     logger.info("Starting phone number extraction")
 
     try:
-        df = pd.read_csv(f"{x}.csv")
-        urls = df["url"].dropna().tolist()
+        with open(f"{x}.csv", "r", newline="", encoding="utf-8") as f:
+            urls = [row["url"] for row in csv.DictReader(f) if row.get("url")]
         logger.info(f"Loaded {len(urls)} URLs")
 
     except Exception:
@@ -59,6 +68,8 @@ def main(x):
 
     for idx, url in enumerate(urls, start=1):
          logger.info(f"[{idx}/{len(urls)}] Processing URL")
+         pipeline_metrics.set_gauge("phone_lookup", "queue_pending", len(urls) - idx + 1)
+         started = time.perf_counter()
 
          options = webdriver.ChromeOptions()
          options.binary_location = "/usr/bin/google-chrome"
@@ -72,8 +83,10 @@ def main(x):
          business_name = extract_business_name(url)
 
          try:
-               driver = webdriver.Chrome(options=options)
-               driver.get(url)
+               with pipeline_metrics.timed("browser_start"):
+                  driver = webdriver.Chrome(options=options)
+               with pipeline_metrics.timed("page_load"):
+                  driver.get(url)
 
                wait = WebDriverWait(driver, 10)
                phone_elem = wait.until(
@@ -86,20 +99,26 @@ def main(x):
                phone_number = data_item.split(":")[-1]
 
                logger.info(f"Phone found: {phone_number}")
+               pipeline_metrics.increment("phone_lookup", "found")
 
          except TimeoutException:
                logger.warning("Phone number not found (timeout)")
+               pipeline_metrics.increment("phone_lookup", "not_found")
 
          except WebDriverException:
                logger.exception("WebDriver error occurred")
+               pipeline_metrics.increment("phone_lookup", "errors")
 
          except Exception:
                logger.exception("Unexpected error occurred")
+               pipeline_metrics.increment("phone_lookup", "errors")
 
          finally:
                if driver:
                   driver.quit()
                   logger.info("WebDriver closed")
+               pipeline_metrics.observe("phone_lookup", time.perf_counter() - started)
+               pipeline_metrics.increment("phone_lookup", "items")
 
          results.append(
                {
@@ -112,68 +131,85 @@ def main(x):
 
     # Save results
     try:
-        result_df = pd.DataFrame(results)
-        result_df.to_csv(f"number_dataset_{str(uuid.uuid4())}.csv", index=False)
-        logger.info(f"Saved {len(result_df)} records to number_dataset.csv")
+        with open(f"number_dataset_{str(uuid.uuid4())}.csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["url", "business_name", "number", "county"])
+            writer.writeheader()
+            writer.writerows(results)
+        pipeline_metrics.increment("output", "rows", len(results))
+        logger.info(f"Saved {len(results)} records to number_dataset.csv")
 
     except Exception:
         logger.exception("Failed to save CSV")
 
     logger.info("Phone number scraping completed")
 
+
+# Counties scraped when none are given on the command line
+KENYAN_COUNTIES = [
+    # {"code": 1, "county": "Mombasa"},
+    # {"code": 2, "county": "Kwale"},
+    # {"code": 3, "county": "Kilifi"},
+    # {"code": 4, "county": "Tana River"},
+    # {"code": 5, "county": "Lamu"},
+    # {"code": 6, "county": "Taita-Taveta"},
+    # {"code": 7, "county": "Garissa"},
+    # {"code": 8, "county": "Wajir"},
+    # {"code": 9, "county": "Mandera"},
+    # {"code": 10, "county": "Marsabit"},
+    # {"code": 11, "county": "Isiolo"},
+    # {"code": 12, "county": "Meru"},
+    # {"code": 13, "county": "Tharaka-Nithi"},
+    # {"code": 14, "county": "Embu"},
+    # {"code": 15, "county": "Kitui"},
+    # {"code": 16, "county": "Machakos"},
+    # {"code": 17, "county": "Makueni"},
+    # {"code": 18, "county": "Nyandarua"},
+    # {"code": 19, "county": "Nyeri"},
+    # {"code": 20, "county": "Kirinyaga"},
+    # {"code": 21, "county": "Murang'a"},
+    # {"code": 22, "county": "Kiambu"},
+    # {"code": 23, "county": "Turkana"},
+    # {"code": 24, "county": "West Pokot"},
+    # {"code": 25, "county": "Samburu"},
+    # {"code": 26, "county": "Trans Nzoia"},
+    # {"code": 27, "county": "Uasin Gishu"},
+    {"code": 28, "county": "Elgeyo-Marakwet"},
+    {"code": 29, "county": "Nandi"},
+    {"code": 30, "county": "Baringo"},
+    {"code": 31, "county": "Laikipia"},
+    {"code": 32, "county": "Nakuru"},
+    # {"code": 33, "county": "Narok"},
+    {"code": 34, "county": "Kajiado"},
+    {"code": 35, "county": "Kericho"},
+    {"code": 36, "county": "Bomet"},
+    {"code": 37, "county": "Kakamega"},
+    {"code": 38, "county": "Vihiga"},
+    {"code": 39, "county": "Bungoma"},
+    {"code": 40, "county": "Busia"},
+    {"code": 41, "county": "Siaya"},
+    {"code": 42, "county": "Kisumu"},
+    {"code": 43, "county": "Homa Bay"},
+    {"code": 44, "county": "Migori"},
+    {"code": 45, "county": "Kisii"},
+    {"code": 46, "county": "Nyamira"},
+    # {"code": 47, "county": "Nairobi"},
+]
+
+
 # ------------------------------------------------------------------
 # ENTRY POINT
 # ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape phone numbers for the links in <county>.csv.")
+    parser.add_argument("--county", action="append", help="county to process (repeatable, default: KENYAN_COUNTIES)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    pipeline_metrics.start("scrape_contacts")
+    counties = args.county or [x['county'] for x in KENYAN_COUNTIES]
+    for county_name in counties:
+        scrape_phone_numbers(x=county_name)
+
+
 if __name__ == "__main__":
-   KENYAN_COUNTIES = [
-      # {"code": 1, "county": "Mombasa"},
-      # {"code": 2, "county": "Kwale"},
-      # {"code": 3, "county": "Kilifi"},
-      # {"code": 4, "county": "Tana River"},
-      # {"code": 5, "county": "Lamu"},
-      # {"code": 6, "county": "Taita-Taveta"},
-      # {"code": 7, "county": "Garissa"},
-    #   {"code": 8, "county": "Wajir"},
-    #   {"code": 9, "county": "Mandera"},
-    #   {"code": 10, "county": "Marsabit"},
-    #   {"code": 11, "county": "Isiolo"},
-    #   {"code": 12, "county": "Meru"},
-    #   {"code": 13, "county": "Tharaka-Nithi"},
-    #   {"code": 14, "county": "Embu"},
-    #   {"code": 15, "county": "Kitui"},
-    #   {"code": 16, "county": "Machakos"},
-    #   {"code": 17, "county": "Makueni"},
-    #   {"code": 18, "county": "Nyandarua"},
-    #   {"code": 19, "county": "Nyeri"},
-    #   {"code": 20, "county": "Kirinyaga"},
-    #   {"code": 21, "county": "Murang'a"},
-    #   {"code": 22, "county": "Kiambu"},
-    #   {"code": 23, "county": "Turkana"},
-    #   {"code": 24, "county": "West Pokot"},
-    #   {"code": 25, "county": "Samburu"},
-    #   {"code": 26, "county": "Trans Nzoia"},
-    #   {"code": 27, "county": "Uasin Gishu"},
-      {"code": 28, "county": "Elgeyo-Marakwet"},
-      {"code": 29, "county": "Nandi"},
-      {"code": 30, "county": "Baringo"},
-      {"code": 31, "county": "Laikipia"},
-      {"code": 32, "county": "Nakuru"},
-    #   {"code": 33, "county": "Narok"},
-      {"code": 34, "county": "Kajiado"},
-      {"code": 35, "county": "Kericho"},
-      {"code": 36, "county": "Bomet"},
-      {"code": 37, "county": "Kakamega"},
-      {"code": 38, "county": "Vihiga"},
-      {"code": 39, "county": "Bungoma"},
-      {"code": 40, "county": "Busia"},
-      {"code": 41, "county": "Siaya"},
-      {"code": 42, "county": "Kisumu"},
-      {"code": 43, "county": "Homa Bay"},
-      {"code": 44, "county": "Migori"},
-      {"code": 45, "county": "Kisii"},
-      {"code": 46, "county": "Nyamira"},
-      # {"code": 47, "county": "Nairobi"},
-   ]
-   counties = [x['county'] for x in KENYAN_COUNTIES]
-   for county_name in counties:
-      main(x = county_name)
+    main()
@@ -1,36 +1,46 @@
+import argparse
+import csv
 import logging
 import sys
 import time
 import uuid
-import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+import pipeline_metrics
+
+# selenium is imported inside scrape_county, so importing this module stays fast
 
 # ------------------------------------------------------------------
 # LOGGING CONFIGURATION
 # ------------------------------------------------------------------
 LOG_FILE = "google_maps_scraper.log"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
-        logging.StreamHandler(sys.stdout),
-    ],
-)
-
 logger = logging.getLogger(__name__)
 
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(message)s",
+        handlers=[
+            logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
+            logging.StreamHandler(sys.stdout),
+        ],
+    )
+
+
 # ------------------------------------------------------------------
-# MAIN SCRIPT
+# SCRAPING
 # ------------------------------------------------------------------
-def main(county_name=None):
+def scrape_county(county_name=None):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
     logger.info("Starting Google Maps scraping")
+    driver = None
 
     try:
         # 1. Setup Chrome WebDriver
@@ -38,11 +48,13 @@ def main(county_name=None):
         options = webdriver.ChromeOptions()
         options.binary_location = "/usr/bin/google-chrome"
         options.add_argument("--start-maximized")
-        driver = webdriver.Chrome(options=options)
+        with pipeline_metrics.timed("browser_start"):
+            driver = webdriver.Chrome(options=options)
 
         # 2. Open Google Maps
         logger.info("Opening Google Maps")
-        driver.get("https://www.google.com/maps")
+        with pipeline_metrics.timed("page_load"):
+            driver.get("https://www.google.com/maps")
         time.sleep(3)
 
         # 3. Search for a place or business
@@ -51,10 +63,11 @@ def main(county_name=None):
         logger.info(f"Searching for: {search_query}")
 
         wait = WebDriverWait(driver, 10)  # wait up to 10 seconds
-        search_box = wait.until(EC.presence_of_element_located((By.ID, search_box_id)))
-        search_box.clear()
-        search_box.send_keys(search_query)
-        search_box.send_keys(Keys.ENTER)
+        with pipeline_metrics.timed("search"):
+            search_box = wait.until(EC.presence_of_element_located((By.ID, search_box_id)))
+            search_box.clear()
+            search_box.send_keys(search_query)
+            search_box.send_keys(Keys.ENTER)
 
         time.sleep(5)
 
@@ -66,17 +79,20 @@ def main(county_name=None):
         logger.info(f"Scrolling results panel {scroll_count} times")
 
         for i in range(scroll_count):
-            driver.execute_script(
-                "arguments[0].scrollTop = arguments[0].scrollHeight",
-                scrollable_div,
-            )
+            with pipeline_metrics.timed("scroll"):
+                driver.execute_script(
+                    "arguments[0].scrollTop = arguments[0].scrollHeight",
+                    scrollable_div,
+                )
             logger.info(f"Scroll iteration {i + 1}/{scroll_count}")
             time.sleep(7)
+            pipeline_metrics.increment("scroll", "sleep_seconds", 7)
 
         # 5. Extract places
         logger.info("Extracting places from page")
         places = driver.find_elements(By.XPATH, '//div[@role="article"]')
         logger.info(f"Found {len(places)} places")
+        pipeline_metrics.increment("extract_places", "places", len(places))
 
         data = []
 
@@ -86,6 +102,7 @@ def main(county_name=None):
             except NoSuchElementException:
                 link_url = ""
                 logger.warning(f"[{idx}] No URL found")
+                pipeline_metrics.increment("extract_places", "missing_url")
 
             try:
                 name = place.text.strip()
@@ -99,17 +116,22 @@ def main(county_name=None):
                 logger.info(f"Extracted {idx}/{len(places)} places")
 
         # 6. Save CSV
-        df = pd.DataFrame(data)
         output_file = f"{county_name}.csv"
-        df.to_csv(output_file, index=False)
+        with open(output_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["name", "url"])
+            writer.writeheader()
+            writer.writerows(data)
+        pipeline_metrics.increment("output", "rows", len(data))
 
-        logger.info(f"Saved {len(df)} records to {output_file}")
+        logger.info(f"Saved {len(data)} records to {output_file}")
 
     except WebDriverException as e:
         logger.exception("WebDriver failure occurred")
+        pipeline_metrics.increment("county", "webdriver_errors")
 
     except Exception as e:
         logger.exception("Unexpected error occurred")
+        pipeline_metrics.increment("county", "errors")
 
     finally:
         try:
@@ -118,63 +140,76 @@ def main(county_name=None):
         except Exception:
             logger.warning("WebDriver could not be closed")
 
+        pipeline_metrics.increment("county", "items")
         logger.info("Scraping finished")
 
 
+# Counties scraped when none are given on the command line
+KENYAN_COUNTIES = [
+    # {"code": 1, "county": "Mombasa"},
+    # {"code": 2, "county": "Kwale"},
+    # {"code": 3, "county": "Kilifi"},
+    # {"code": 4, "county": "Tana River"},
+    # {"code": 5, "county": "Lamu"},
+    # {"code": 6, "county": "Taita-Taveta"},
+    # {"code": 7, "county": "Garissa"},
+    # {"code": 8, "county": "Wajir"},
+    # {"code": 9, "county": "Mandera"},
+    # {"code": 10, "county": "Marsabit"},
+    # {"code": 11, "county": "Isiolo"},
+    # {"code": 12, "county": "Meru"},
+    # {"code": 13, "county": "Tharaka-Nithi"},
+    # {"code": 14, "county": "Embu"},
+    # {"code": 15, "county": "Kitui"},
+    # {"code": 16, "county": "Machakos"},
+    # {"code": 17, "county": "Makueni"},
+    # {"code": 18, "county": "Nyandarua"},
+    # {"code": 19, "county": "Nyeri"},
+    # {"code": 20, "county": "Kirinyaga"},
+    # {"code": 21, "county": "Murang'a"},
+    # {"code": 22, "county": "Kiambu"},
+    # {"code": 23, "county": "Turkana"},
+    # {"code": 24, "county": "West Pokot"},
+    # {"code": 25, "county": "Samburu"},
+    # {"code": 26, "county": "Trans Nzoia"},
+    # {"code": 27, "county": "Uasin Gishu"},
+    # {"code": 28, "county": "Elgeyo-Marakwet"},
+    # {"code": 29, "county": "Nandi"},
+    # {"code": 30, "county": "Baringo"},
+    {"code": 31, "county": "Laikipia"},
+    {"code": 32, "county": "Nakuru"},
+    {"code": 33, "county": "Narok"},
+    {"code": 34, "county": "Kajiado"},
+    {"code": 35, "county": "Kericho"},
+    {"code": 36, "county": "Bomet"},
+    {"code": 37, "county": "Kakamega"},
+    {"code": 38, "county": "Vihiga"},
+    {"code": 39, "county": "Bungoma"},
+    {"code": 40, "county": "Busia"},
+    {"code": 41, "county": "Siaya"},
+    {"code": 42, "county": "Kisumu"},
+    {"code": 43, "county": "Homa Bay"},
+    {"code": 44, "county": "Migori"},
+    {"code": 45, "county": "Kisii"},
+    {"code": 46, "county": "Nyamira"},
+    # {"code": 47, "county": "Nairobi"},
+]
+
+
 # ------------------------------------------------------------------
 # ENTRY POINT
 # ------------------------------------------------------------------
-if __name__ == "__main__":
-    KENYAN_COUNTIES = [
-        # {"code": 1, "county": "Mombasa"},
-        # {"code": 2, "county": "Kwale"},
-        # {"code": 3, "county": "Kilifi"},
-        # {"code": 4, "county": "Tana River"},
-        # {"code": 5, "county": "Lamu"},
-        # {"code": 6, "county": "Taita-Taveta"},
-        # {"code": 7, "county": "Garissa"},
-        # {"code": 8, "county": "Wajir"},
-        # {"code": 9, "county": "Mandera"},
-        # {"code": 10, "county": "Marsabit"},
-        # {"code": 11, "county": "Isiolo"},
-        # {"code": 12, "county": "Meru"},
-        # {"code": 13, "county": "Tharaka-Nithi"},
-        # {"code": 14, "county": "Embu"},
-        # {"code": 15, "county": "Kitui"},
-        # {"code": 16, "county": "Machakos"},
-        # {"code": 17, "county": "Makueni"},
-        # {"code": 18, "county": "Nyandarua"},
-        # {"code": 19, "county": "Nyeri"},
-        # {"code": 20, "county": "Kirinyaga"},
-        # {"code": 21, "county": "Murang'a"},
-        # {"code": 22, "county": "Kiambu"},
-        # {"code": 23, "county": "Turkana"},
-        # {"code": 24, "county": "West Pokot"},
-        # {"code": 25, "county": "Samburu"},
-        # {"code": 26, "county": "Trans Nzoia"},
-        # {"code": 27, "county": "Uasin Gishu"},
-        # {"code": 28, "county": "Elgeyo-Marakwet"},
-        # {"code": 29, "county": "Nandi"},
-        # {"code": 30, "county": "Baringo"},
-        {"code": 31, "county": "Laikipia"},
-        {"code": 32, "county": "Nakuru"},
-        {"code": 33, "county": "Narok"},
-        {"code": 34, "county": "Kajiado"},
-        {"code": 35, "county": "Kericho"},
-        {"code": 36, "county": "Bomet"},
-        {"code": 37, "county": "Kakamega"},
-        {"code": 38, "county": "Vihiga"},
-        {"code": 39, "county": "Bungoma"},
-        {"code": 40, "county": "Busia"},
-        {"code": 41, "county": "Siaya"},
-        {"code": 42, "county": "Kisumu"},
-        {"code": 43, "county": "Homa Bay"},
-        {"code": 44, "county": "Migori"},
-        {"code": 45, "county": "Kisii"},
-        {"code": 46, "county": "Nyamira"},
-        # {"code": 47, "county": "Nairobi"},
-    ]
-
-    counties = [x['county'] for x in KENYAN_COUNTIES]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape Google Maps clinic links per county into <county>.csv.")
+    parser.add_argument("--county", action="append", help="county to scrape (repeatable, default: KENYAN_COUNTIES)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    pipeline_metrics.start("scrape_links")
+    counties = args.county or [x['county'] for x in KENYAN_COUNTIES]
     for county_name in counties:
-        main(county_name=county_name)
+        scrape_county(county_name=county_name)
+
+
+if __name__ == "__main__":
+    main()
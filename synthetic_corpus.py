@@ -0,0 +1,280 @@
+import base64
+import json
+import random
+import zipfile
+from datetime import date, timedelta
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+FIRST_NAMES = ["Amina", "Brian", "Cynthia", "David", "Esther", "Felix", "Grace", "Hassan", "Irene", "James",
+               "Joyce", "Kevin", "Lydia", "Moses", "Njeri", "Otieno", "Purity", "Samuel", "Wanjiru", "Yusuf"]
+LAST_NAMES = ["Achieng", "Barasa", "Chege", "Kamau", "Kiprono", "Mutua", "Mwangi", "Njoroge", "Odhiambo",
+              "Omondi", "Otieno", "Wafula", "Wambui", "Wekesa"]
+# (test, unit, low, high)
+TESTS = [
+    ("Haemoglobin", "g/dl", 12.0, 16.0), ("WBC", "x10^9/L", 4.0, 11.0), ("Platelets", "x10^9/L", 150, 400),
+    ("CRP", "mg/L", 0.0, 5.0), ("Glucose", "mmol/L", 3.9, 6.1), ("Creatinine", "umol/L", 60, 110),
+    ("Urea", "mmol/L", 2.5, 7.8), ("ALT", "U/L", 7, 56), ("AST", "U/L", 10, 40), ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.1), ("ESR", "mm/hr", 0, 20), ("HbA1c", "%", 4.0, 5.6), ("TSH", "mIU/L", 0.4, 4.0),
+]
+
+# Schema the synthetic reports follow; written as every schema file the pipelines load
+SCHEMA = {
+    "type": "object",
+    # Rules fill both for a clean report; a remark row they can't parse sends it to the LLM stage
+    "required": ["patient_name", "tests"],
+    "properties": {
+        "patient_name": {"type": "string"},
+        "requested_by": {"type": "string"},
+        "age": {"type": "integer"},
+        "sex": {"type": "string"},
+        "report_date": {"type": "string", "format": "date"},
+        "tests": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "test_name": {"type": "string"},
+                    "result": {"type": "string"},
+                    "unit": {"type": "string"},
+                    "reference_range": {"type": "string"},
+                },
+            },
+        },
+    },
+}
+
+# 1x1 PNG, repeated into a larger "scan" so image handling has something to strip
+_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+# ------------------------------------------------------------------
+# REPORT CONTENT
+# ------------------------------------------------------------------
+# Remarks written as an extra table row; rule_based_extraction.py can't parse them
+REMARKS = ["Comment: sample haemolysed, repeat advised", "Comment: results phoned to ward", "Comment: see attached film"]
+
+
+def make_report(rng: random.Random, tests_per_report: int, rules_complete: bool = True) -> dict:
+    tests = []
+    for name, unit, low, high in rng.sample(TESTS, min(tests_per_report, len(TESTS))):
+        value = round(rng.uniform(low * 0.7, high * 1.3), 1)
+        tests.append((name, str(value), unit, f"{low}-{high}"))
+    return {
+        "patient_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(1, 90),
+        "sex": rng.choice(["Male", "Female"]),
+        "requested_by": f"Dr. {rng.choice(LAST_NAMES)}",
+        "date": (date(2025, 1, 1) + timedelta(days=rng.randint(0, 364))).strftime("%d/%m/%Y"),
+        "tests": tests,
+        "remark": None if rules_complete else rng.choice(REMARKS),
+    }
+
+
+def table_rows(report: dict) -> list:
+    """The test rows, plus the remark (if any) as a row with only its first cell filled."""
+    return list(report["tests"]) + ([(report["remark"], "", "", "")] if report.get("remark") else [])
+
+
+def report_lines(report: dict) -> list:
+    return [
+        "BAHARI MEDICAL LABORATORY",
+        f"Patient Name: {report['patient_name']}",
+        f"Age: {report['age']} yrs",
+        f"Sex: {report['sex']}",
+        f"Date: {report['date']}",
+        f"Requested by: {report['requested_by']}",
+    ]
+
+
+def report_html(report: dict) -> str:
+    rows = "".join(f"<tr><td>{t}</td><td>{v}</td><td>{u}</td><td>{r}</td></tr>" for t, v, u, r in table_rows(report))
+    head = "".join(f"<p>{escape(line)}</p>" for line in report_lines(report))
+    return f"{head}<table><tr><td>Test</td><td>Result</td><td>Units</td><td>Reference Range</td></tr>{rows}</table>"
+
+
+def report_text(report: dict) -> str:
+    rows = "\n".join("  ".join(cell for cell in row if cell) for row in table_rows(report))
+    return "\n".join(report_lines(report)) + f"\n\nTest  Result  Units  Range\n{rows}\n"
+
+
+# ------------------------------------------------------------------
+# DOCX
+# ------------------------------------------------------------------
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="png" ContentType="image/png"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rIdImage1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" '
+    'Target="media/image1.png"/></Relationships>'
+)
+_IMAGE_RUN = (
+    '<w:r><w:drawing><wp:inline><wp:extent cx="952500" cy="952500"/><wp:docPr id="1" name="Logo"/>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:pic><pic:nvPicPr><pic:cNvPr id="1" name="logo.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="rIdImage1"/></pic:blipFill><pic:spPr/></pic:pic>'
+    '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+)
+_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"'
+)
+
+
+def _paragraph(text: str) -> str:
+    return f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def _cell(text: str) -> str:
+    return f"<w:tc>{_paragraph(text)}</w:tc>"
+
+
+def write_docx(path: Path, report: dict, image_bytes: int = 0):
+    """A minimal but valid DOCX (what mammoth needs), optionally with an embedded image."""
+    rows = [("Test", "Result", "Units", "Reference Range")] + table_rows(report)
+    table = "<w:tbl>" + "".join("<w:tr>" + "".join(_cell(c) for c in row) + "</w:tr>" for row in rows) + "</w:tbl>"
+    image = f"<w:p>{_IMAGE_RUN}</w:p>" if image_bytes else ""
+    body = image + "".join(_paragraph(line) for line in report_lines(report)) + table
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f"<w:document {_NAMESPACES}><w:body>{body}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", _DOCX_RELS)
+        docx.writestr("word/document.xml", document)
+        if image_bytes:
+            docx.writestr("word/_rels/document.xml.rels", _DOCUMENT_RELS)
+            # Pad the PNG so its size is realistic; mammoth doesn't decode it
+            docx.writestr("word/media/image1.png", _PNG + b"\0" * max(0, image_bytes - len(_PNG)))
+
+
+# ------------------------------------------------------------------
+# PDF
+# ------------------------------------------------------------------
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, report: dict, pages: int = 1):
+    """A minimal text PDF (Helvetica, uncompressed) with the report repeated over `pages` pages."""
+    lines = report_text(report).splitlines()
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        commands = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({_pdf_string(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(commands)} >>\nstream\n{commands}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(out))
+
+
+# ------------------------------------------------------------------
+# CORPUS
+# ------------------------------------------------------------------
+def generate_corpus(root: Path, documents: int = 100, duplicate_rate: float = 0.1, image_rate: float = 0.5,
+                    image_bytes: int = 50000, pdf_pages: int = 2, tests_per_report: int = 8,
+                    csv_files: int = 10, csv_rows: int = 1000, rules_complete_rate: float = 0.3, seed: int = 0) -> dict:
+    """
+    Write a synthetic corpus under root:
+      media/     nested folders of .docx and .pdf reports (with "Copy of" duplicates)
+      html/      the reports as HTML, text/ as plain text (extraction inputs)
+      drive/     PDFs served by the fake Drive
+      csvs/      CSV exports with drifting columns (concatenation input)
+    and the schema files the pipelines load. A rules_complete_rate share of
+    the reports can be completed by rule_based_extraction.py alone, the
+    rest carry a remark row that sends them to the LLM. Returns counts per kind.
+    """
+    rng = random.Random(seed)
+    folders = {name: root / name for name in ("media", "html", "text", "drive", "csvs")}
+    for folder in folders.values():
+        folder.mkdir(parents=True, exist_ok=True)
+
+    counts = {"docx": 0, "pdf": 0, "html": 0, "text": 0, "drive": 0, "csv": 0, "duplicates": 0, "rules_complete": 0}
+    for i in range(documents):
+        # Spread evenly, so the share is exact rather than left to the random draw
+        report = make_report(rng, tests_per_report, int((i + 1) * rules_complete_rate) > int(i * rules_complete_rate))
+        counts["rules_complete"] += report["remark"] is None
+        subfolder = folders["media"] / f"batch_{i % 10:02d}" / ("archive" if i % 3 == 0 else "")
+        subfolder.mkdir(parents=True, exist_ok=True)
+        stem = f"report_{i:05d}"
+
+        if i % 2 == 0:
+            docx_path = subfolder / f"{stem}.docx"
+            write_docx(docx_path, report, image_bytes if rng.random() < image_rate else 0)
+            counts["docx"] += 1
+            if rng.random() < duplicate_rate:
+                (subfolder / f"Copy of {stem}.docx").write_bytes(docx_path.read_bytes())
+                counts["duplicates"] += 1
+        else:
+            write_pdf(subfolder / f"{stem}.pdf", report, pdf_pages)
+            counts["pdf"] += 1
+
+        (folders["html"] / f"{stem}.html").write_text(report_html(report), encoding="utf-8")
+        (folders["text"] / f"{stem}.txt").write_text(report_text(report), encoding="utf-8")
+        counts["html"] += 1
+        counts["text"] += 1
+        if i % 4 == 1:
+            write_pdf(folders["drive"] / f"{stem}.pdf", report, pdf_pages)
+            counts["drive"] += 1
+
+    base_columns = ["patient_name", "age", "sex", "visit_date", "diagnosis", "amount"]
+    for i in range(csv_files):
+        columns = base_columns + (["insurer"] if i % 3 == 0 else [])
+        with open(folders["csvs"] / f"export_{i:03d}.csv", "w", encoding="utf-8") as f:
+            f.write(",".join(columns) + "\n")
+            for _ in range(csv_rows):
+                row = [
+                    f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    # Older exports wrote ages as decimals
+                    str(rng.randint(1, 90)) + (".0" if i % 4 == 0 else ""),
+                    rng.choice(["M", "F"]),
+                    (date(2025, 1, 1) + timedelta(days=rng.randint(0, 364))).isoformat(),
+                    rng.choice(["Malaria", "Typhoid", "UTI", "Hypertension", "Diabetes"]),
+                    f"{rng.uniform(200, 5000):.2f}",
+                ] + (["NHIF"] if i % 3 == 0 else [])
+                f.write(",".join(row) + "\n")
+        counts["csv"] += 1
+
+    for schema_file in ("labresult_schema.json", "external_labresult_schema.json", "schema.json"):
+        with open(root / schema_file, "w", encoding="utf-8") as f:
+            json.dump(SCHEMA, f, indent=2)
+
+    return counts
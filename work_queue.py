@@ -0,0 +1,199 @@
+import argparse
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+# A claimed item goes back to the queue if its worker doesn't finish or renew it in time
+default_lease_seconds = 900
+# Items are marked failed after this many claims
+default_max_attempts = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    updated REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, priority);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Durable work queue in a SQLite file that any number of processes, on
+    this machine or on others sharing the filesystem, can claim items from.
+    A claim is a lease: if the worker dies, the item is handed out again
+    once the lease expires, until max_attempts is reached.
+
+    Items are keyed by file name rather than full path, so hosts that mount
+    the shared folder at different paths still agree on them.
+    """
+
+    def __init__(self, path: Path, lease_seconds: float = default_lease_seconds,
+                 max_attempts: int = default_max_attempts):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Rollback journal (not WAL) so locking also works on network filesystems
+        self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so two claimers can't pick the same row."""
+        return _Transaction(self._conn)
+
+    def enqueue(self, items) -> int:
+        """
+        Add (key, priority) or (key, priority, modified) items. Keys that are
+        pending, leased or failed are left alone. A done key is reset to
+        pending with fresh attempts if its file was modified (given as a
+        timestamp) after it was completed, i.e. a new file with the same name
+        arrived; without a timestamp a done key is always reset. Returns how
+        many were new or reset.
+        """
+        now = time.time()
+        rows = [(key, priority, now, modified[0] if modified else now) for key, priority, *modified in items]
+        with self._transaction() as cur:
+            before = self._conn.total_changes
+            cur.executemany(
+                "INSERT INTO items (key, priority, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET status = 'pending', priority = excluded.priority, attempts = 0, "
+                "worker = NULL, lease_expires = NULL, error = NULL, updated = excluded.updated "
+                "WHERE items.status = 'done' AND ? >= items.updated",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def requeue_stalled(self, cur=None) -> int:
+        """Return items whose lease expired to the queue (or fail them if out of attempts)."""
+        if cur is None:
+            with self._transaction() as cur:
+                return self.requeue_stalled(cur)
+        now = time.time()
+        cur.execute(
+            "UPDATE items SET status = 'failed', worker = NULL, error = 'lease expired', updated = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        cur.execute(
+            "UPDATE items SET status = 'pending', worker = NULL, updated = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (now, now),
+        )
+        return cur.rowcount
+
+    def claim(self, worker: str):
+        """Lease the highest-priority pending item. Returns its key, or None if nothing is pending."""
+        now = time.time()
+        with self._transaction() as cur:
+            self.requeue_stalled(cur)
+            row = cur.execute(
+                "SELECT key FROM items WHERE status = 'pending' ORDER BY priority DESC, key LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                "UPDATE items SET status = 'leased', worker = ?, attempts = attempts + 1, "
+                "lease_expires = ?, updated = ? WHERE key = ?",
+                (worker, now + self.lease_seconds, now, row[0]),
+            )
+            return row[0]
+
+    def renew(self, key: str, worker: str) -> bool:
+        """Extend a lease. False means the lease was lost and another worker may have the item."""
+        now = time.time()
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE items SET lease_expires = ?, updated = ? WHERE key = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, key, worker),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, key: str, worker: str) -> bool:
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE items SET status = 'done', worker = NULL, lease_expires = NULL, error = NULL, updated = ? "
+                "WHERE key = ? AND worker = ? AND status = 'leased'",
+                (time.time(), key, worker),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, key: str, worker: str, error: str):
+        """Give an item back after an error; it is retried until max_attempts."""
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE key = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, str(error)[:2000], time.time(), key, worker),
+            )
+
+    def retry_failed(self) -> int:
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE items SET status = 'pending', attempts = 0, error = NULL, updated = ? WHERE status = 'failed'",
+                (time.time(),),
+            )
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        """Queue depth per status, plus how many leases have expired."""
+        counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall())
+        stalled = self._conn.execute(
+            "SELECT COUNT(*) FROM items WHERE status = 'leased' AND lease_expires < ?", (time.time(),)
+        ).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in ("pending", "leased", "done", "failed")}
+        stats["stalled"] = stalled
+        return stats
+
+    def close(self):
+        self._conn.close()
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._cur = self._conn.cursor()
+        self._cur.execute("BEGIN IMMEDIATE")
+        return self._cur
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cur.execute("ROLLBACK" if exc_type else "COMMIT")
+        self._cur.close()
+
+
+# ------------------------------------------------------------------
+# ENTRY POINT: inspect or repair a queue
+# ------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Show queue depth and repair a work queue.")
+    parser.add_argument("queue_file", type=Path)
+    parser.add_argument("--requeue-stalled", action="store_true", help="return expired leases to the queue now")
+    parser.add_argument("--retry-failed", action="store_true", help="reset failed items to pending")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue_file)
+    if args.requeue_stalled:
+        print(f"Requeued {queue.requeue_stalled()} stalled items")
+    if args.retry_failed:
+        print(f"Reset {queue.retry_failed()} failed items")
+    for status, count in queue.stats().items():
+        print(f"{status:>8}: {count}")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()